@@ -1,7 +1,11 @@
 import streamlit as st
 import pandas as pd
-from src.utils import load_json
-from datetime import datetime
+from src.utils import load_json, month_key
+from src.similarity import SimilarityIndex, INDEX_DIR, META_FILENAME
+from src.facets import FacetIndex, FACETS_PATH
+from src.table import papers_to_frame, importance_trend, topic_trend
+from src.profiling import RenderProfiler, is_enabled, CPROFILE_KEY
+import os
 import streamlit.components.v1 as components
 
 # ページ設定
@@ -12,6 +16,9 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# 再描画の区間計測 (APP_PROFILE=1 または ?profile=1 のときのみ)
+profiler = RenderProfiler(st.session_state, enabled=is_enabled(st.query_params))
+
 # CSSによるスタイリング
 st.markdown("""
     <style>
@@ -47,6 +54,7 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
+@profiler.section("copy_to_clipboard")
 def copy_to_clipboard(text):
     """
     Copy text to clipboard using JavaScript with fallback for non-HTTPS environments.
@@ -111,7 +119,54 @@ def copy_to_clipboard(text):
 
 # データの読み込み
 PAPERS_FILE = "data/papers.json"
-papers = load_json(PAPERS_FILE, [])
+with profiler.section("load"):
+    papers = load_json(PAPERS_FILE, [])
+
+# 更新のたびに行列ファイルが置き換わる (mtime が変わる) ので、古いインデックスを
+# キャッシュに残すと削除済みファイルの memory-map を掴み続ける。最新の1つだけ保持する。
+@st.cache_resource(max_entries=1)
+def load_similarity_index(index_mtime):
+    """類似論文インデックスを memory-map で開く (index_mtime はキャッシュ無効化用)"""
+    return SimilarityIndex.load(INDEX_DIR)
+
+@st.cache_resource(max_entries=1)
+def build_similarity_index(_papers, paper_ids):
+    """インデックスファイルが使えない場合にメモリ上で構築する (paper_ids はキャッシュキー)"""
+    return SimilarityIndex.from_papers(_papers)
+
+def get_similarity_index(papers):
+    meta_path = os.path.join(INDEX_DIR, META_FILENAME)
+    index_mtime = os.path.getmtime(meta_path) if os.path.exists(meta_path) else None
+    index = load_similarity_index(index_mtime) if index_mtime else None
+    # インデックス未作成 or papers.json より古い場合はメモリ上で構築
+    if index is None or any(p.get('id') not in index for p in papers):
+        index = build_similarity_index(papers, tuple(p.get('id') for p in papers))
+    return index
+
+@st.cache_resource(max_entries=1)
+def load_facet_index(index_mtime):
+    """絞り込み用の転置インデックスを読み込む (index_mtime はキャッシュ無効化用)"""
+    return FacetIndex.load(FACETS_PATH)
+
+@st.cache_resource(max_entries=1)
+def build_facet_index(_papers, paper_ids):
+    """インデックスファイルが使えない場合にメモリ上で構築する (paper_ids はキャッシュキー)"""
+    return FacetIndex.from_papers(_papers)
+
+def get_facet_index(papers):
+    index_mtime = os.path.getmtime(FACETS_PATH) if os.path.exists(FACETS_PATH) else None
+    index = load_facet_index(index_mtime) if index_mtime else None
+    if index is None or any(p.get('id') not in index for p in papers):
+        index = build_facet_index(papers, tuple(p.get('id') for p in papers))
+    return index
+
+@st.cache_data(max_entries=1)
+def get_trends(_papers, paper_ids):
+    """月別の重要度・キーワード件数 (paper_ids はキャッシュキー)。集計後の表だけを保持する"""
+    df = papers_to_frame(_papers)
+    importance = importance_trend(df).drop(index="Others", errors="ignore")
+    importance.columns = ["★" * int(level) for level in importance.columns]
+    return importance, topic_trend(df).drop(index="Others", errors="ignore")
 
 # サイドバー
 st.sidebar.title("Configuration")
@@ -120,159 +175,230 @@ st.sidebar.link_button("🚀 Open NotebookLM", notebook_lm_url)
 st.sidebar.markdown("---")
 st.sidebar.info("毎日更新: 最新の論文1件をピックアップ")
 
-if not papers:
-    st.info("No papers available.")
-else:
-    # 1. データの整理とソート (新しい順 -> fetched_date優先, なければpub_date)
-    # 日付フォーマットのばらつきを吸収してソートキーを作る
-    def get_sort_key(p):
-        fd = p.get('fetched_date')
-        if fd: return fd
-        pd_val = p.get('pub_date')
-        if pd_val and pd_val != 'Unknown': return pd_val
-        return '0000-00-00'
-
-    sorted_papers = sorted(papers, key=get_sort_key, reverse=True)
-
-    # 2. グルーピング
-    # - Latest (Top 1)
-    # - Recent (Past 7 days excluding Top 1)
-    # - Archive (Older)
+# st.rerun() や例外で中断されても計測を終え、cProfile を止める
+try:
+    if not papers:
+        st.info("No papers available.")
+    else:
+        # 1. データの整理とソート (新しい順 -> fetched_date優先, なければpub_date)
+        # 日付フォーマットのばらつきを吸収してソートキーを作る
+        def get_sort_key(p):
+            fd = p.get('fetched_date')
+            if fd: return fd
+            pd_val = p.get('pub_date')
+            if pd_val and pd_val != 'Unknown': return pd_val
+            return '0000-00-00'
+
+        with profiler.section("sort"):
+            sorted_papers = sorted(papers, key=get_sort_key, reverse=True)
+
+        # 2. グルーピング
+        # - Latest (Top 1)
+        # - Recent (Past 7 days excluding Top 1)
+        # - Archive (Older)
     
-    # ここではシンプルに「件数」で区切るか、「日付」で区切るか。
-    # 要望: "毎朝1個ずつの更新...過去1週間分はすぐにtapできるように"
-    # -> index 0 が Today's Pick
-    # -> index 1-7 が Past Week (approx)
-    # -> index 8- が Archive
+        # ここではシンプルに「件数」で区切るか、「日付」で区切るか。
+        # 要望: "毎朝1個ずつの更新...過去1週間分はすぐにtapできるように"
+        # -> index 0 が Today's Pick
+        # -> index 1-7 が Past Week (approx)
+        # -> index 8- が Archive
     
-    latest_paper = sorted_papers[0]
-    recent_papers = sorted_papers[1:8]  # Next 7 papers
-    archive_papers = sorted_papers[8:]   # The rest
+        latest_paper = sorted_papers[0]
+        recent_papers = sorted_papers[1:8]  # Next 7 papers
+        archive_papers = sorted_papers[8:]   # The rest
 
-    # session_stateで表示する論文を管理
-    if 'selected_paper_id' not in st.session_state:
-        st.session_state.selected_paper_id = latest_paper.get('id')
+        # session_stateで表示する論文を管理
+        if 'selected_paper_id' not in st.session_state:
+            st.session_state.selected_paper_id = latest_paper.get('id')
 
-    # リストから選択された場合の処理用コールバック
-    def set_selected_paper(paper_id):
-        st.session_state.selected_paper_id = paper_id
-        # トップへスクロール（Streamlitの仕様上難しいが、再描画で上に戻ることを期待）
+        # リストから選択された場合の処理用コールバック
+        def set_selected_paper(paper_id):
+            st.session_state.selected_paper_id = paper_id
+            # トップへスクロール（Streamlitの仕様上難しいが、再描画で上に戻ることを期待）
 
-    # --- Main Display Area ---
+        # --- Main Display Area ---
     
-    # 選択された論文を探す
-    current_paper = next((p for p in sorted_papers if p.get('id') == st.session_state.selected_paper_id), latest_paper)
-
-    # ヘッダー (LatestかPastか区別しやすく)
-    if current_paper == latest_paper:
-        st.caption("🌟 Today's Pick")
-    elif current_paper in recent_papers:
-        st.caption("📅 Recent Update")
-    else:
-        st.caption("🗄 Archive")
+        # 選択された論文を探す
+        current_paper = next((p for p in sorted_papers if p.get('id') == st.session_state.selected_paper_id), latest_paper)
+
+        with profiler.section("widgets.paper"):
+            # ヘッダー (LatestかPastか区別しやすく)
+            if current_paper == latest_paper:
+                st.caption("🌟 Today's Pick")
+            elif current_paper in recent_papers:
+                st.caption("📅 Recent Update")
+            else:
+                st.caption("🗄 Archive")
 
-    # タイトル
-    st.title(current_paper.get('title_ja', 'No Title'))
+            # タイトル
+            st.title(current_paper.get('title_ja', 'No Title'))
     
-    # メタ情報
-    importance = current_paper.get('importance', 1)
-    stars = "★" * importance
-    pub_date = current_paper.get('pub_date', 'Unknown')
-    st.markdown(f"**Importance:** <span style='color:orange'>{stars}</span> | **Published:** {pub_date}", unsafe_allow_html=True)
+            # メタ情報
+            importance = current_paper.get('importance', 1)
+            stars = "★" * importance
+            pub_date = current_paper.get('pub_date', 'Unknown')
+            st.markdown(f"**Importance:** <span style='color:orange'>{stars}</span> | **Published:** {pub_date}", unsafe_allow_html=True)
     
-    st.markdown("---")
+            st.markdown("---")
 
-    # Clinical Action (最重要)
-    st.info(f"#### 💡 Clinical Action\n\n{current_paper.get('clinical_action', 'N/A')}")
+            # Clinical Action (最重要)
+            st.info(f"#### 💡 Clinical Action\n\n{current_paper.get('clinical_action', 'N/A')}")
     
-    # Summary
-    st.markdown(f"#### 📝 Summary\n{current_paper.get('summary', 'N/A')}")
+            # Summary
+            st.markdown(f"#### 📝 Summary\n{current_paper.get('summary', 'N/A')}")
     
-    st.markdown("---")
+            st.markdown("---")
     
-    # 詳細情報 (Expandable)
-    with st.expander("Details & Source", expanded=False):
-        st.markdown("**PubMed URL**:")
-        copy_to_clipboard(current_paper.get('url', ''))
-        st.markdown("---")
-        st.markdown(f"**Original Title:** {current_paper.get('original_title', '')}")
-        st.markdown(f"**Abstract:**\n{current_paper.get('abstract', 'No abstract available')}")
+            # 詳細情報 (Expandable)
+            with st.expander("Details & Source", expanded=False):
+                st.markdown("**PubMed URL**:")
+                copy_to_clipboard(current_paper.get('url', ''))
+                st.markdown("---")
+                st.markdown(f"**Original Title:** {current_paper.get('original_title', '')}")
+                st.markdown(f"**Abstract:**\n{current_paper.get('abstract', 'No abstract available')}")
+
+        # 類似論文 (TF-IDFのコサイン類似度)
+        with profiler.section("widgets.related"):
+            papers_by_id = {p.get('id'): p for p in sorted_papers}
+            related = [
+                (papers_by_id[rid], score)
+                for rid, score in get_similarity_index(papers).related(current_paper.get('id'), k=5)
+                if rid in papers_by_id
+            ]
+            if related:
+                st.markdown("#### 🔗 Related Papers")
+                for p, score in related:
+                    label = f"{p.get('title_ja', p.get('original_title', 'No Title'))[:40]}... ({score:.2f})"
+                    if st.button(label, key=f"related_{p.get('id')}", use_container_width=True):
+                        set_selected_paper(p.get('id'))
+                        st.rerun()
 
-    st.markdown("<br><br>", unsafe_allow_html=True)
+        st.markdown("<br><br>", unsafe_allow_html=True)
 
-    # --- Navigation Area (Bottom) ---
-    st.header("📚 Past Updates")
+        # --- Navigation Area (Bottom) ---
+        st.header("📚 Past Updates")
     
-    # タブで「最近（1週間）」と「アーカイブ」を分ける
-    tab1, tab2 = st.tabs(["Recent (Past 7)", "Archives"])
+        # タブで「最近（1週間）」と「アーカイブ」を分ける
+        tab1, tab2, tab3, tab4 = st.tabs(["Recent (Past 7)", "Archives", "Filter", "Trends"])
     
-    with tab1:
-        if not recent_papers:
-            st.write("No recent papers.")
-        else:
-            for p in recent_papers:
-                # ボタンとして配置し、クリックで選択状態を変更
-                # ボタンのラベルに日付とタイトルを入れる
-                date_str = p.get('fetched_date', '').split('T')[0] or p.get('pub_date', '')
-                label = f"【{date_str}】 {p.get('title_ja', p.get('title', 'No Title'))[:40]}..."
+        with tab1, profiler.section("widgets.recent"):
+            if not recent_papers:
+                st.write("No recent papers.")
+            else:
+                for p in recent_papers:
+                    # ボタンとして配置し、クリックで選択状態を変更
+                    # ボタンのラベルに日付とタイトルを入れる
+                    date_str = p.get('fetched_date', '').split('T')[0] or p.get('pub_date', '')
+                    label = f"【{date_str}】 {p.get('title_ja', p.get('title', 'No Title'))[:40]}..."
                 
-                # keyにIDを使ってユニークにする
-                if st.button(label, key=f"btn_{p.get('id')}", use_container_width=True):
-                    set_selected_paper(p.get('id'))
-                    st.rerun()
+                    # keyにIDを使ってユニークにする
+                    if st.button(label, key=f"btn_{p.get('id')}", use_container_width=True):
+                        set_selected_paper(p.get('id'))
+                        st.rerun()
 
-    with tab2:
-        if not archive_papers:
-            st.write("No archives.")
-        else:
-            # 1. Group by Year-Month
-            archives_by_month = {}
-            for p in archive_papers:
-                # Use fetched_date or pub_date
-                date_str = p.get('fetched_date')
-                if not date_str:
-                    date_str = p.get('pub_date', 'Unknown')
-                
-                # Extract YYYY-MM
-                try:
-                    # Try parsing ISO format first
-                    dt = datetime.fromisoformat(date_str)
-                    month_key = dt.strftime("%Y-%m")
-                except ValueError:
-                    # Fallback for simple date strings or unknown
-                    month_key = date_str[:7] if len(date_str) >= 7 else "Others"
-                
-                if month_key not in archives_by_month:
-                    archives_by_month[month_key] = []
-                archives_by_month[month_key].append(p)
+        with tab2, profiler.section("widgets.archives"):
+            if not archive_papers:
+                st.write("No archives.")
+            else:
+                # 1. Group by Year-Month
+                with profiler.section("grouping"):
+                    archives_by_month = {}
+                    for p in archive_papers:
+                        # Extract YYYY-MM (fetched_date or pub_date)
+                        archives_by_month.setdefault(month_key(p), []).append(p)
 
-            # 2. Select Month
-            # Sort months descending
-            sorted_months = sorted(archives_by_month.keys(), reverse=True)
+                # 2. Select Month
+                # Sort months descending
+                sorted_months = sorted(archives_by_month.keys(), reverse=True)
             
-            selected_month = st.selectbox(
-                "Select Month",
-                options=sorted_months,
-                key="archive_month_select"
-            )
-
-            # 3. Select Paper from that Month
-            if selected_month:
-                papers_in_month = archives_by_month[selected_month]
+                selected_month = st.selectbox(
+                    "Select Month",
+                    options=sorted_months,
+                    key="archive_month_select"
+                )
+
+                # 3. Select Paper from that Month
+                if selected_month:
+                    papers_in_month = archives_by_month[selected_month]
                 
-                archive_options = {f"{p.get('fetched_date', '').split('T')[0] or 'Unknown'} - {p.get('title_ja', '')[:30]}...": p.get('id') for p in papers_in_month}
+                    archive_options = {f"{p.get('fetched_date', '').split('T')[0] or 'Unknown'} - {p.get('title_ja', '')[:30]}...": p.get('id') for p in papers_in_month}
                 
-                selected_archive_label = st.selectbox(
-                    "Select Paper", 
-                    options=list(archive_options.keys()),
-                    key="archive_paper_select",
-                    index=None,
-                    placeholder="Choose a paper..."
-                )
+                    selected_archive_label = st.selectbox(
+                        "Select Paper", 
+                        options=list(archive_options.keys()),
+                        key="archive_paper_select",
+                        index=None,
+                        placeholder="Choose a paper..."
+                    )
                 
-                if selected_archive_label:
-                    selected_id = archive_options[selected_archive_label]
-                    if st.button("View Selected Archive", key="view_archive_btn"):
-                        set_selected_paper(selected_id)
-                        st.rerun()
+                    if selected_archive_label:
+                        selected_id = archive_options[selected_archive_label]
+                        if st.button("View Selected Archive", key="view_archive_btn"):
+                            set_selected_paper(selected_id)
+                            st.rerun()
+
+        with tab3, profiler.section("widgets.filter"):
+            # 転置インデックスによる絞り込み (同じ項目内はOR、項目間はAND)
+            facet_index = get_facet_index(papers)
+
+            def facet_select(label, facet, key, format_value=str, descending=False):
+                # descending=True なら件数順ではなく値の降順 (月・重要度)
+                options = facet_index.values(facet)
+                if descending:
+                    options = sorted(options, reverse=True)
+                return st.multiselect(
+                    label,
+                    options=options,
+                    format_func=lambda v: f"{format_value(v)} ({facet_index.count(facet, v)})",
+                    key=key
+                )
 
+            col1, col2 = st.columns(2)
+            with col1:
+                selected_keywords = facet_select("Keyword", "keyword", "filter_keyword")
+                selected_types = facet_select("Publication Type", "pub_type", "filter_pub_type")
+            with col2:
+                selected_importance = facet_select("Importance", "importance", "filter_importance", lambda v: "★" * int(v), descending=True)
+                selected_months = facet_select("Month", "month", "filter_month", descending=True)
+
+            matched_ids = {str(pmid) for pmid in facet_index.query({
+                "keyword": selected_keywords,
+                "pub_type": selected_types,
+                "importance": selected_importance,
+                "month": selected_months,
+            })}
+            filtered_papers = [p for p in sorted_papers if p.get('id') in matched_ids]
+
+            st.caption(f"{len(filtered_papers)} papers")
+            for p in filtered_papers:
+                date_str = p.get('fetched_date', '').split('T')[0] or p.get('pub_date', '')
+                label = f"【{date_str}】 {p.get('title_ja', p.get('title', 'No Title'))[:40]}..."
+                if st.button(label, key=f"filter_{p.get('id')}", use_container_width=True):
+                    set_selected_paper(p.get('id'))
+                    st.rerun()
+
+        with tab4, profiler.section("widgets.trends"):
+            # 月別の推移 (列指向テーブルで集計)
+            importance_by_month, topics_by_month = get_trends(papers, tuple(p.get('id') for p in papers))
+            st.caption("月別の新着件数 (重要度別)")
+            st.bar_chart(importance_by_month)
+            st.caption("月別の注目キーワード")
+            st.line_chart(topics_by_month)
+finally:
+    profiler.finish()
+
+# --- Render Profiling (APP_PROFILE=1 または ?profile=1) ---
+if profiler.enabled:
+    timing_rows, n_reruns = profiler.summary()
+    with st.sidebar:
+        st.markdown("---")
+        st.subheader("⏱ Render Profile")
+        st.caption(f"直近 {n_reruns} 回の再描画 (ms, 区間は入れ子を含む)")
+        st.dataframe(pd.DataFrame.from_dict(timing_rows, orient="index").round(1), use_container_width=True)
+        st.checkbox("次の再描画で cProfile を記録", key=CPROFILE_KEY)
+        if profiler.stats_path:
+            st.caption(f"Saved: {profiler.stats_path}")
+            with open(profiler.stats_path, "rb") as f:
+                st.download_button("Download .pstats", f.read(), file_name=os.path.basename(profiler.stats_path))
+            with st.expander("Top functions (cumulative)"):
+                st.code(profiler.top_functions())
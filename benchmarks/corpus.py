@@ -0,0 +1,112 @@
+"""
+ベンチマーク用の合成コーパス。
+
+data/papers.json と同じ形のレコード (日本語の要約、長い英語Abstract、
+"2025-Oct" / "2025-Sep-03" / "2026" のようにばらつく pub_date) を乱数シードから再現可能に生成する。
+"""
+import random
+from datetime import datetime, timedelta
+
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+TOPICS_EN = [
+    "GLP-1 receptor agonists", "SGLT2 inhibitors", "video laryngoscope", "regional anesthesia",
+    "POCUS", "frailty", "prehabilitation", "postoperative delirium", "enhanced recovery after surgery",
+    "perioperative anticoagulation", "obstetric anesthesia", "pediatric airway management",
+    "postoperative nausea and vomiting", "goal-directed fluid therapy", "cardiac surgery analgesia",
+]
+STUDY_TYPES_EN = ["guideline", "systematic review", "meta-analysis", "narrative review", "consensus statement"]
+WORDS_EN = (
+    "patients perioperative outcomes surgery anesthesia risk management evidence trials randomized "
+    "controlled analysis mortality complications postoperative recommendations assessment clinical "
+    "practice incidence associated reduced increased significant cohort data safety efficacy "
+    "intraoperative monitoring ventilation hemodynamic blood pressure aspiration gastric emptying "
+    "recovery pain opioid consumption length stay quality certainty"
+).split()
+
+TOPICS_JA = [
+    "GLP-1受容体作動薬", "SGLT2阻害薬", "ビデオ喉頭鏡", "区域麻酔", "POCUS", "フレイル",
+    "プレハビリテーション", "術後せん妄", "ERAS", "周術期抗凝固療法", "産科麻酔", "小児気道管理",
+    "術後悪心嘔吐", "目標指向型輸液療法", "心臓手術の鎮痛",
+]
+STUDY_TYPES_JA = ["ガイドライン", "系統的レビュー", "メタアナリシス", "ナラティブレビュー", "コンセンサスステートメント"]
+SENTENCES_JA = [
+    "{topic}は周術期管理において重要な位置を占めている。",
+    "術前評価の段階でリスクを層別化することが推奨される。",
+    "最新のエビデンスでは従来の常識が見直されつつある。",
+    "高齢患者では合併症の発生率が有意に高いことが示された。",
+    "術後の早期離床と経口摂取の再開が回復を促進する。",
+    "{topic}に関する推奨の確実性は中等度である。",
+]
+ACTIONS_JA = [
+    "術前に{topic}の使用歴を必ず確認してください。",
+    "誤嚥リスクが高い場合は迅速導入を検討しましょう。",
+    "多職種で情報を共有し、術後管理の方針を事前に決めておくことが重要です。",
+    "施設のプロトコルを最新の推奨に合わせて更新してください。",
+    "気道確保困難が予想される症例では早期からビデオ喉頭鏡を準備しましょう。",
+]
+
+
+def _pub_date(rng, d):
+    # PubMedの出版日の形式のばらつきを再現する
+    style = rng.random()
+    if style < 0.45:
+        return f"{d.year}-{MONTHS[d.month - 1]}"
+    if style < 0.85:
+        return f"{d.year}-{MONTHS[d.month - 1]}-{d.day:02d}"
+    if style < 0.95:
+        return str(d.year)
+    return "Unknown"
+
+
+def _abstract(rng, topic, study_type, n_words):
+    words = [rng.choice(WORDS_EN) for _ in range(n_words)]
+    # 文の区切りとトピック語を散りばめる
+    for i in range(0, n_words, rng.randint(12, 25)):
+        words[i] = words[i].capitalize()
+        if i:
+            words[i - 1] += "."
+    words.insert(rng.randint(0, len(words)), topic)
+    return f"This {study_type} evaluates {topic}. " + " ".join(words) + "."
+
+
+def generate_papers(n, seed=42, duplicate_rate=0.02, missing_fetched_rate=0.05, abstract_words=(180, 350)):
+    """papers.json 形式の論文を n 件生成する"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, 6, 0, 0)
+    papers = []
+    titles = []
+
+    for i in range(n):
+        t = rng.randrange(len(TOPICS_EN))
+        s = rng.randrange(len(STUDY_TYPES_EN))
+        topic_en, topic_ja = TOPICS_EN[t], TOPICS_JA[t]
+        study_en, study_ja = STUDY_TYPES_EN[s], STUDY_TYPES_JA[s]
+
+        # 一部はタイトル重複 (大文字小文字・記号違い) にして dedupe の対象にする
+        if titles and rng.random() < duplicate_rate:
+            original_title = rng.choice(titles).upper().rstrip(".") + "!"
+        else:
+            original_title = f"{study_en.title()} on {topic_en} in {rng.choice(WORDS_EN)} {rng.choice(WORDS_EN)}: update {i}."
+            titles.append(original_title)
+
+        fetched = start + timedelta(days=i * 0.5, seconds=rng.randint(0, 3600))
+        published = fetched - timedelta(days=rng.randint(0, 365))
+        pmid = str(39000000 + i * 7 + rng.randint(0, 6))
+
+        paper = {
+            "title_ja": f"{topic_ja}に関する{study_ja}（{i}）",
+            "summary": "\n".join(rng.choice(SENTENCES_JA).format(topic=topic_ja) for _ in range(3)),
+            "clinical_action": "\n".join(rng.choice(ACTIONS_JA).format(topic=topic_ja) for _ in range(5)),
+            "importance": rng.choices([1, 2, 3, 4, 5], weights=[1, 2, 4, 6, 8])[0],
+            "original_title": original_title,
+            "url": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/",
+            "id": pmid,
+            "pub_date": _pub_date(rng, published),
+            "abstract": _abstract(rng, topic_en, study_en, rng.randint(*abstract_words)),
+        }
+        if rng.random() >= missing_fetched_rate:
+            paper["fetched_date"] = fetched.isoformat()
+        papers.append(paper)
+
+    return papers
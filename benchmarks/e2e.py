@@ -0,0 +1,185 @@
+"""
+run_batch.py のエンドツーエンド・スループット計測。
+
+PubMed (FakeEntrez)・Gemini・LINE をローカルのフェイクに差し替えて run_batch.main を N件で実行し、
+papers/sec、ステージごとの p50/p95 レイテンシ、ピークRSS を表示する。
+data/ は一時ディレクトリに作るのでリポジトリのデータは変更しない。
+
+    python -m benchmarks.e2e --papers 100
+    python -m benchmarks.e2e --papers 50 --gemini-latency 0.8 --gemini-throttle-rate 0.1 --line-latency 2
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import resource
+import tempfile
+import functools
+
+from src.utils import load_json, save_json
+from src.metrics import percentile
+from fakes.pubmed import FakeEntrez
+from fakes.gemini_server import FakeGeminiServer
+from fakes.line_server import FakeLineServer
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimer:
+    """関数をラップしてステージごとの所要時間を記録する"""
+
+    def __init__(self):
+        self.durations = {}
+        self._patched = []
+
+    def record(self, stage, seconds):
+        self.durations.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage if isinstance(stage, str) else stage(*args), time.perf_counter() - start)
+        return timed
+
+    def patch(self, obj, name, stage):
+        original = getattr(obj, name)
+        self._patched.append((obj, name, original))
+        setattr(obj, name, self.wrap(stage, original))
+
+    def set(self, obj, name, value):
+        self._patched.append((obj, name, getattr(obj, name)))
+        setattr(obj, name, value)
+
+    def restore(self):
+        for obj, name, original in reversed(self._patched):
+            setattr(obj, name, original)
+        self._patched.clear()
+
+    def summary(self):
+        return {
+            stage: {
+                "calls": len(values),
+                "total": sum(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+            }
+            for stage, values in self.durations.items()
+        }
+
+
+def run(n_papers, pubmed=None, gemini=None, line=None, gemini_sleep=0.0):
+    """フェイク環境で run_batch.main(max_results=n_papers) を1回実行し、計測結果を返す"""
+    import run_batch
+    import src.fetcher as fetcher
+    import src.summarizer as summarizer
+    import src.notifier as notifier
+    import src.utils as utils
+
+    timer = StageTimer()
+    entrez = FakeEntrez(n_results=n_papers, **(pubmed or {}))
+    cwd = os.getcwd()
+
+    with FakeGeminiServer(**(gemini or {})) as gemini_server, \
+            FakeLineServer(**(line or {})) as line_server, \
+            tempfile.TemporaryDirectory() as workdir:
+        try:
+            # 外部APIをフェイクに向ける
+            timer.set(fetcher, "Entrez", entrez)
+            timer.set(summarizer, "GEMINI_API_KEY", "fake-key")
+            timer.set(summarizer, "GEMINI_BASE_URL", gemini_server.url)
+            timer.set(summarizer, "RATE_LIMIT_SLEEP", gemini_sleep)
+            timer.set(notifier, "LINE_CHANNEL_ACCESS_TOKEN", "fake-token")
+            for name, path in (("BROADCAST", "broadcast"), ("PUSH", "push"), ("MULTICAST", "multicast")):
+                timer.set(notifier, f"LINE_MESSAGING_API_{name}", f"{line_server.url}/v2/bot/message/{path}")
+
+            # ステージごとの計測
+            timer.patch(entrez, "esearch", "esearch")
+            timer.patch(entrez, "efetch", "efetch")
+            timer.patch(entrez, "read", lambda handle, **kw: f"parse_{getattr(handle, 'kind', 'xml')}")
+            timer.patch(run_batch, "summarize_paper", "summarize")
+            timer.patch(utils.Transaction, "commit", "save_papers")
+            timer.patch(run_batch, "update_index", "similarity_index")
+            timer.patch(run_batch, "update_facet_index", "facet_index")
+            timer.patch(run_batch, "update_rollups", "weekly_rollups")
+            timer.patch(notifier, "send_messages", "notify")
+
+            # data/ 以下の相対パスを一時ディレクトリに向ける
+            os.chdir(workdir)
+            os.makedirs("data", exist_ok=True)
+
+            start = time.perf_counter()
+            run_batch.main(max_results=n_papers)
+            elapsed = time.perf_counter() - start
+
+            papers = load_json("data/papers.json", [])
+        finally:
+            os.chdir(cwd)
+            timer.restore()
+
+    failed = sum(1 for p in papers if p.get('title_ja') == "要約エラー")
+    return {
+        "papers": len(papers),
+        "summarize_errors": failed,
+        "elapsed": elapsed,
+        "papers_per_sec": len(papers) / elapsed if elapsed else 0.0,
+        # Linux の ru_maxrss は KB 単位
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "stages": timer.summary(),
+        "status_counts": {
+            "pubmed": entrez.faults.status_counts,
+            "gemini": gemini_server.status_counts,
+            "line": line_server.status_counts,
+        },
+    }
+
+
+def print_report(report):
+    print(f"papers: {report['papers']} (summarize errors: {report['summarize_errors']})")
+    print(f"elapsed: {report['elapsed']:.2f} s   throughput: {report['papers_per_sec']:.2f} papers/s   "
+          f"peak RSS: {report['peak_rss_mb']:.1f} MB")
+    print(f"{'stage':<18}{'calls':>7}{'total s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for stage, s in report["stages"].items():
+        print(f"{stage:<18}{s['calls']:>7}{s['total']:>10.2f}{s['p50'] * 1000:>10.1f}{s['p95'] * 1000:>10.1f}")
+    for service, counts in report["status_counts"].items():
+        print(f"{service} responses: {dict(sorted(counts.items()))}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end throughput of run_batch.py against local fakes")
+    parser.add_argument("--papers", type=int, default=100)
+    for service in ("pubmed", "gemini", "line"):
+        parser.add_argument(f"--{service}-latency", type=float, default=0.0, help="seconds per request")
+        parser.add_argument(f"--{service}-error-rate", type=float, default=0.0, help="probability of HTTP 500")
+        parser.add_argument(f"--{service}-throttle-rate", type=float, default=0.0, help="probability of HTTP 429")
+    parser.add_argument("--gemini-sleep", type=float, default=0.0,
+                        help="summarizer.RATE_LIMIT_SLEEP during the run (production: 1s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the report to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="show batch INFO logs")
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    def faults(service):
+        return {
+            "latency": getattr(args, f"{service}_latency"),
+            "error_rate": getattr(args, f"{service}_error_rate"),
+            "throttle_rate": getattr(args, f"{service}_throttle_rate"),
+            "seed": args.seed,
+        }
+
+    report = run(args.papers, faults("pubmed"), faults("gemini"), faults("line"), args.gemini_sleep)
+    print_report(report)
+    if args.json:
+        save_json(args.json, report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""
+データ層のベンチマーク。
+
+    python -m benchmarks.run                       # 1k / 10k / 100k
+    python -m benchmarks.run --scales 1000 10000 --repeat 3
+
+合成コーパス (benchmarks/corpus.py) に対して load / save / sort / 月別グルーピング /
+ID検索 / タイトル重複排除 を計測し、結果を benchmarks/results/history.json に追記する。
+直前の記録より遅くなったものは regression として表示する。
+"""
+import os
+import gc
+import sys
+import time
+import random
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+
+from src.utils import load_json, save_json, month_key, normalize_title
+from src.fetcher import build_title_index
+from src.table import papers_to_frame, sort_order, group_by_month
+from fix_data import remove_duplicates
+from benchmarks.corpus import generate_papers
+
+HISTORY_PATH = "benchmarks/results/history.json"
+DEFAULT_SCALES = [1000, 10000, 100000]
+# 直前の記録の中央値よりこの割合以上遅く、かつ差が MIN_DELTA 秒以上なら regression とみなす
+REGRESSION_THRESHOLD = 0.2
+MIN_DELTA = 0.001
+N_LOOKUPS = 100
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def get_sort_key(p):
+    # app.py のソートキー (dict のリストをそのままソートする)
+    fd = p.get('fetched_date')
+    if fd: return fd
+    pd_val = p.get('pub_date')
+    if pd_val and pd_val != 'Unknown': return pd_val
+    return '0000-00-00'
+
+
+@benchmark("load_json")
+def bench_load(ctx):
+    load_json(ctx["json_path"], [])
+
+
+@benchmark("save_json")
+def bench_save(ctx):
+    save_json(ctx["save_path"], ctx["papers"])
+
+
+@benchmark("to_frame")
+def bench_to_frame(ctx):
+    papers_to_frame(ctx["papers"])
+
+
+@benchmark("sort")
+def bench_sort(ctx):
+    # 列指向テーブルで行位置の並びだけを求める (sort_dicts との比較用)
+    sort_order(ctx["frame"])
+
+
+@benchmark("sort_dicts")
+def bench_sort_dicts(ctx):
+    sorted(ctx["papers"], key=get_sort_key, reverse=True)
+
+
+@benchmark("month_bucketing")
+def bench_month_bucketing(ctx):
+    group_by_month(ctx["frame"])
+
+
+@benchmark("month_bucketing_dicts")
+def bench_month_bucketing_dicts(ctx):
+    buckets = {}
+    for p in ctx["papers"]:
+        buckets.setdefault(month_key(p), []).append(p)
+
+
+@benchmark("id_lookup_scan")
+def bench_id_lookup_scan(ctx):
+    # app.py と同じく線形探索で選択中の論文を探す
+    papers = ctx["papers"]
+    for target in ctx["lookup_ids"]:
+        next((p for p in papers if p.get('id') == target), None)
+
+
+@benchmark("id_lookup_dict")
+def bench_id_lookup_dict(ctx):
+    by_id = {p.get('id'): p for p in ctx["papers"]}
+    for target in ctx["lookup_ids"]:
+        by_id.get(target)
+
+
+@benchmark("dedupe_fetch")
+def bench_dedupe_fetch(ctx):
+    # fetcher: 既存タイトル集合を作り、新着候補のタイトルを照合する
+    existing_titles = build_title_index(ctx["papers"])
+    for title in ctx["candidate_titles"]:
+        normalize_title(title) in existing_titles
+
+
+@benchmark("dedupe_fix_data")
+def bench_dedupe_fix_data(ctx):
+    remove_duplicates(ctx["papers"])
+
+
+def _time(func, ctx, repeat):
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func(ctx)
+        timings.append(time.perf_counter() - start)
+    return {"min": min(timings), "median": statistics.median(timings), "repeat": repeat}
+
+
+def run_scale(n, repeat, names, workdir):
+    papers = generate_papers(n)
+    json_path = os.path.join(workdir, f"papers_{n}.json")
+    save_json(json_path, papers)
+
+    rng = random.Random(n)
+    ctx = {
+        "papers": papers,
+        "frame": papers_to_frame(papers),
+        "json_path": json_path,
+        "save_path": os.path.join(workdir, f"papers_{n}_out.json"),
+        "lookup_ids": [p["id"] for p in rng.sample(papers, min(N_LOOKUPS, n))],
+        "candidate_titles": [p["original_title"] for p in rng.sample(papers, min(N_LOOKUPS, n))],
+    }
+
+    results = {"file_bytes": os.path.getsize(json_path)}
+    for name in names:
+        results[name] = _time(BENCHMARKS[name], ctx, repeat)
+        print(f"  {name:<24} min {results[name]['min'] * 1000:10.2f} ms   median {results[name]['median'] * 1000:10.2f} ms")
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def find_regressions(current, history):
+    """直前の記録と比べて遅くなったベンチマークを [(scale, name, 前回, 今回), ...] で返す"""
+    if not history:
+        return []
+    previous = history[-1]["scales"]
+    regressions = []
+    for scale, results in current.items():
+        for name, result in results.items():
+            before = previous.get(scale, {}).get(name)
+            if not isinstance(result, dict) or not isinstance(before, dict):
+                continue
+            if (result["median"] > before["median"] * (1 + REGRESSION_THRESHOLD)
+                    and result["median"] - before["median"] > MIN_DELTA):
+                regressions.append((scale, name, before["median"], result["median"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the data layer at several archive sizes")
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument("--history", default=HISTORY_PATH)
+    parser.add_argument("--no-save", action="store_true", help="do not append results to the history")
+    args = parser.parse_args(argv)
+
+    # load_json / save_json / remove_duplicates のログを抑える
+    logging.disable(logging.INFO)
+    names = args.only or list(BENCHMARKS)
+
+    scales = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in args.scales:
+            print(f"[{n} papers]")
+            scales[str(n)] = run_scale(n, args.repeat, names, workdir)
+    logging.disable(logging.NOTSET)
+
+    history = load_json(args.history, []) if os.path.exists(args.history) else []
+    regressions = find_regressions(scales, history)
+    for scale, name, before, after in regressions:
+        print(f"REGRESSION {name} @ {scale}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms")
+
+    if not args.no_save:
+        history.append({
+            "timestamp": datetime.now().isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "scales": scales,
+        })
+        save_json(args.history, history)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+ローカルのスタブサーバー / フェイクの共通部分。
+
+FaultInjector で遅延・エラー率・429 (Retry-After 付き) を再現し、
+FakeHTTPServer はスレッドで起動できる HTTP サーバーの土台を提供する。
+"""
+import json
+import time
+import random
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+
+class FaultInjector:
+    """リクエストごとに遅延を入れ、一定確率で 429 / 500 を返す"""
+
+    def __init__(self, latency=0.0, error_rate=0.0, throttle_rate=0.0, retry_after=1, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.status_counts = {}
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+
+    def inject(self):
+        """遅延を入れたうえで、失敗させる場合はステータスコード (429/500) を返す。成功なら None。"""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.throttle_rate:
+            return 429
+        if roll < self.throttle_rate + self.error_rate:
+            return 500
+        return None
+
+    def record(self, status):
+        with self._lock:
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+
+class FakeHTTPServer:
+    """
+    サブクラスで handle(method, path, headers, body) を実装し、
+    (ステータス, レスポンスヘッダー, JSONボディ) を返す。
+
+        with FakeXxxServer(latency=0.2, throttle_rate=0.1) as server:
+            ... server.url に向けてリクエスト ...
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, error_rate=0.0,
+                 throttle_rate=0.0, retry_after=1, seed=None):
+        self.faults = FaultInjector(latency, error_rate, throttle_rate, retry_after, seed)
+        self.requests = []
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def status_counts(self):
+        return self.faults.status_counts
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """フォアグラウンドで起動する (Ctrl+C で終了)"""
+        try:
+            self._httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._httpd.server_close()
+
+    def stop(self):
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def handle(self, method, path, headers, body):
+        raise NotImplementedError
+
+    def _dispatch(self, method, path, headers, body):
+        status = self.faults.inject()
+        if status == 429:
+            return 429, {"Retry-After": str(self.faults.retry_after)}, {"message": "Too many requests"}
+        if status == 500:
+            return 500, {}, {"message": "Internal server error"}
+        return self.handle(method, path, headers, body)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _respond(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                status, headers, payload = server._dispatch(method, self.path, self.headers, body)
+                server.faults.record(status)
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._respond("GET")
+
+            def do_POST(self):
+                self._respond("POST")
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+        return Handler
+
+
+def add_fault_arguments(parser, default_port):
+    """スタブサーバーの CLI 共通オプション"""
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=default_port)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of HTTP 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="probability of HTTP 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on 429")
+    parser.add_argument("--seed", type=int, default=None)
@@ -0,0 +1,70 @@
+"""
+Gemini API (generateContent) のローカルスタブサーバー。
+
+プロンプトの Title から決まった形の要約JSONを返す。遅延・エラー率・429 を設定できる。
+
+    python -m fakes.gemini_server --port 8082 --latency 1.5
+    GEMINI_BASE_URL=http://127.0.0.1:8082 GEMINI_API_KEY=dummy python run_batch.py
+"""
+import re
+import json
+import zlib
+import logging
+import argparse
+from .base import FakeHTTPServer, add_fault_arguments
+
+logger = logging.getLogger(__name__)
+
+GENERATE_CONTENT_PATH = re.compile(r"^/v1(?:beta)?/models/([^/:]+):generateContent")
+TITLE_LINE = re.compile(r"^Title:\s*(.*)$", re.M)
+
+
+def canned_summary(title):
+    """タイトルから決まる要約JSON (summarizer の出力形式)"""
+    return {
+        "title_ja": f"【テスト】{title[:60]}",
+        "summary": "周術期管理に関する最新の知見をまとめた論文である。\n主要な推奨事項が更新された。\n臨床への影響は中等度である。",
+        "clinical_action": "術前評価で該当するリスク因子を確認してください。\n施設のプロトコルを最新の推奨に合わせて見直しましょう。",
+        "importance": 1 + zlib.crc32(title.encode("utf-8")) % 5,
+    }
+
+
+class FakeGeminiServer(FakeHTTPServer):
+    def handle(self, method, path, headers, body):
+        match = GENERATE_CONTENT_PATH.match(path)
+        if method != "POST" or not match:
+            return 404, {}, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}}
+        if not headers.get("x-goog-api-key") and "key=" not in path:
+            return 403, {}, {"error": {"code": 403, "message": "API key missing", "status": "PERMISSION_DENIED"}}
+
+        try:
+            request = json.loads(body or b"{}")
+            prompt = "".join(part.get("text", "") for content in request.get("contents", []) for part in content.get("parts", []))
+        except (ValueError, AttributeError):
+            return 400, {}, {"error": {"code": 400, "message": "Invalid JSON payload", "status": "INVALID_ARGUMENT"}}
+
+        title = TITLE_LINE.search(prompt)
+        text = json.dumps(canned_summary(title.group(1).strip() if title else ""), ensure_ascii=False)
+        with self._lock:
+            self.requests.append({"model": match.group(1), "prompt": prompt})
+        return 200, {}, {
+            "candidates": [{
+                "content": {"parts": [{"text": text}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4},
+            "modelVersion": match.group(1),
+        }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Local stand-in for the Gemini generateContent API")
+    add_fault_arguments(parser, default_port=8082)
+    args = parser.parse_args()
+
+    server = FakeGeminiServer(args.host, args.port, args.latency, args.error_rate,
+                              args.throttle_rate, args.retry_after, args.seed)
+    logger.info(f"Fake Gemini API listening on {server.url}")
+    server.serve_forever()
@@ -0,0 +1,70 @@
+"""
+LINE Messaging API のローカルスタブサーバー。
+
+遅延・エラー率・429 (Retry-After 付き) を設定でき、受け取ったリクエストを記録する。
+
+    python -m fakes.line_server --port 8081 --latency 0.5 --throttle-rate 0.2
+    LINE_API_BASE=http://127.0.0.1:8081 LINE_CHANNEL_ACCESS_TOKEN=dummy python run_batch.py
+"""
+import json
+import logging
+import argparse
+from .base import FakeHTTPServer, add_fault_arguments
+
+logger = logging.getLogger(__name__)
+
+ENDPOINTS = ("/v2/bot/message/broadcast", "/v2/bot/message/push", "/v2/bot/message/multicast")
+MAX_MESSAGES_PER_REQUEST = 5
+MAX_MULTICAST_RECIPIENTS = 500
+
+
+class FakeLineServer(FakeHTTPServer):
+    """
+    with FakeLineServer(latency=0.2, throttle_rate=0.1) as server:
+        os.environ["LINE_API_BASE"] = server.url
+        ...
+        server.requests  # 受理したリクエスト
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._retry_keys = set()
+
+    def handle(self, method, path, headers, body):
+        if method != "POST" or path not in ENDPOINTS:
+            return 404, {}, {"message": "Not found"}
+        if not headers.get("Authorization", "").startswith("Bearer "):
+            return 401, {}, {"message": "Authentication failed"}
+
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            return 400, {}, {"message": "The request body has 1 error(s)"}
+        messages = payload.get("messages") or []
+        if not 1 <= len(messages) <= MAX_MESSAGES_PER_REQUEST:
+            return 400, {}, {"message": "Size must be between 1 and 5"}
+        if path.endswith("/multicast") and not 1 <= len(payload.get("to") or []) <= MAX_MULTICAST_RECIPIENTS:
+            return 400, {}, {"message": "Size must be between 1 and 500"}
+        if path.endswith("/push") and not isinstance(payload.get("to"), str):
+            return 400, {}, {"message": "The property, 'to', in the request body is invalid"}
+
+        retry_key = headers.get("X-Line-Retry-Key")
+        with self._lock:
+            if retry_key and retry_key in self._retry_keys:
+                return 409, {}, {"message": "The retry key is already accepted"}
+            if retry_key:
+                self._retry_keys.add(retry_key)
+            self.requests.append({"path": path, "payload": payload})
+        return 200, {}, {}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Local stand-in for the LINE Messaging API")
+    add_fault_arguments(parser, default_port=8081)
+    args = parser.parse_args()
+
+    server = FakeLineServer(args.host, args.port, args.latency, args.error_rate,
+                            args.throttle_rate, args.retry_after, args.seed)
+    logger.info(f"Fake LINE API listening on {server.url}")
+    server.serve_forever()
@@ -0,0 +1,97 @@
+"""
+Bio.Entrez の代わりに src.fetcher へ差し込むフェイク。
+
+Bio.Entrez は E-utilities のURLが固定のため、HTTPサーバーではなくモジュールごと差し替える。
+efetch は記録済みのXML (fakes/data/pubmed_efetch.xml) の論文を複製して任意件数を返し、
+解析は本物の Bio.Entrez.read で行う。遅延・エラー率・429 は FaultInjector で再現する。
+
+    import src.fetcher
+    src.fetcher.Entrez = FakeEntrez(n_results=100, latency=0.3)
+"""
+import io
+import os
+import re
+import copy
+import logging
+import xml.etree.ElementTree as ET
+from urllib.error import HTTPError
+from Bio import Entrez
+from .base import FaultInjector
+
+logger = logging.getLogger(__name__)
+
+RECORDED_EFETCH_XML = os.path.join(os.path.dirname(__file__), "data", "pubmed_efetch.xml")
+
+ESEARCH_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8" ?>\n'
+    '<!DOCTYPE eSearchResult PUBLIC "-//NLM//DTD esearch 20060628//EN" '
+    '"https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20060628/esearch.dtd">\n'
+)
+EFETCH_HEADER = (
+    '<?xml version="1.0" ?>\n'
+    '<!DOCTYPE PubmedArticleSet PUBLIC "-//NLM//DTD PubMedArticle, 1st January 2025//EN" '
+    '"https://dtd.nlm.nih.gov/ncbi/pubmed/out/pubmed_250101.dtd">\n'
+)
+
+
+class FakeEntrez:
+    """
+    src.fetcher が使う Entrez.esearch / efetch / read / email を提供する。
+    PMID は first_pmid から連番で払い出す。
+    """
+
+    def __init__(self, n_results=100, first_pmid=50000000, xml_path=RECORDED_EFETCH_XML,
+                 latency=0.0, error_rate=0.0, throttle_rate=0.0, max_tries=3, seed=None):
+        self.email = "harness@example.com"
+        self.n_results = n_results
+        self.first_pmid = first_pmid
+        self.max_tries = max_tries
+        self.faults = FaultInjector(latency, error_rate, throttle_rate, seed=seed)
+        tree = ET.parse(xml_path)
+        self._templates = tree.getroot().findall("PubmedArticle")
+        if not self._templates:
+            raise ValueError(f"No PubmedArticle in {xml_path}")
+
+    def _request(self, url):
+        # Bio.Entrez._open と同じく 429 / 5xx は max_tries 回まで再試行する
+        for attempt in range(self.max_tries):
+            status = self.faults.inject()
+            self.faults.record(status or 200)
+            if status is None:
+                return
+            if attempt == self.max_tries - 1:
+                raise HTTPError(url, status, "Too Many Requests" if status == 429 else "Internal Server Error", None, None)
+
+    def _handle(self, xml_text, kind):
+        handle = io.BytesIO(xml_text.encode("utf-8"))
+        handle.kind = kind
+        return handle
+
+    def esearch(self, db="pubmed", term="", retmax=20, **kwargs):
+        self._request("https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi")
+        count = min(self.n_results, int(retmax))
+        ids = "".join(f"<Id>{self.first_pmid + i}</Id>" for i in range(count))
+        xml_text = (
+            f"{ESEARCH_HEADER}<eSearchResult><Count>{self.n_results}</Count><RetMax>{count}</RetMax>"
+            f"<RetStart>0</RetStart><IdList>{ids}</IdList><TranslationSet/>"
+            f"<QueryTranslation>{re.sub(r'[<>&]', ' ', term)}</QueryTranslation></eSearchResult>\n"
+        )
+        return self._handle(xml_text, "esearch")
+
+    def efetch(self, db="pubmed", id=None, **kwargs):
+        self._request("https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi")
+        ids = id.split(",") if isinstance(id, str) else list(id or [])
+        articles = []
+        for pmid in ids:
+            article = copy.deepcopy(self._templates[int(pmid) % len(self._templates)])
+            article.find("MedlineCitation/PMID").text = str(pmid)
+            # タイトル重複チェックに引っかからないよう PMID を付ける
+            title = article.find("MedlineCitation/Article/ArticleTitle")
+            title.text = f"{title.text} [{pmid}]"
+            articles.append(ET.tostring(article, encoding="unicode"))
+        xml_text = f"{EFETCH_HEADER}<PubmedArticleSet>\n" + "\n".join(articles) + "\n</PubmedArticleSet>\n"
+        return self._handle(xml_text, "efetch")
+
+    def read(self, handle, **kwargs):
+        # XML の解析は本物の Bio.Entrez.read で行う
+        return Entrez.read(handle, **kwargs)
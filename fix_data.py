@@ -3,8 +3,11 @@ import logging
 import os
 import time
 from dotenv import load_dotenv
-from src.utils import load_json, save_json
+from src.utils import load_json_versioned, save_json_merged, normalize_title
 from src.summarizer import summarize_paper
+from src.similarity import rebuild_index
+from src.facets import rebuild_facet_index
+from src.digest import backfill
 
 # ロギング設定
 logging.basicConfig(level=logging.INFO)
@@ -15,25 +18,8 @@ load_dotenv()
 
 PAPERS_FILE = "data/papers.json"
 
-def fix_data():
-    logger.info("Starting data fix process...")
-    papers = load_json(PAPERS_FILE, [])
-    
-    if not papers:
-        logger.info("No papers found.")
-        return
-
-    # 1. Deduplication (Existing duplicates)
-    # ユーザー指摘の重複を解消する。
-    
-    def normalize_title(t):
-        if not t: return ""
-        # 小文字化して、英数字以外を除去
-        import re
-        s = t.lower()
-        s = re.sub(r'[^a-z0-9]', '', s)
-        return s
-    
+def remove_duplicates(papers):
+    """英語タイトルが重複する論文を取り除く (先に出てきたものを残す)"""
     unique_papers = []
     seen_titles = set()
     duplicates_removed = 0
@@ -66,6 +52,20 @@ def fix_data():
         unique_papers.append(paper)
         
     logger.info(f"Removed {duplicates_removed} duplicates.")
+    return unique_papers
+
+def fix_data():
+    logger.info("Starting data fix process...")
+    # 再要約の間に日次バッチが追記した論文を失わないよう、バージョン付きで読み込む
+    papers, version = load_json_versioned(PAPERS_FILE, [])
+    
+    if not papers:
+        logger.info("No papers found.")
+        return
+
+    # 1. Deduplication (Existing duplicates)
+    # ユーザー指摘の重複を解消する。
+    unique_papers = remove_duplicates(papers)
     
     # 2. Fix Errors
     # title_ja が "要約エラー" などのものを再実行
@@ -91,7 +91,8 @@ def fix_data():
                 # app.pyを見ると 'abstract' キーはあるみたいだが、要約エラー時は abstract を保存しているか？
                 # summarizer.py のエラー処理ブロックでは abstract: paper.get('abstract') を保存している。OK。
                 "url": paper.get('url'),
-                "pub_date": paper.get('pub_date')
+                "pub_date": paper.get('pub_date'),
+                "pub_types": paper.get('pub_types', [])
             }
             
             if not reconstruct_paper['abstract']:
@@ -119,8 +120,12 @@ def fix_data():
 
     logger.info(f"Fixed {fixed_count} errors.")
     
-    # Save
-    save_json(PAPERS_FILE, updated_papers)
+    # Save (読み込み後に他のプロセスが追記していたら、その論文も取り込んで保存する)
+    updated_papers = save_json_merged(PAPERS_FILE, updated_papers, papers, version)
+    # 重複削除・再要約で内容が変わるためインデックスも作り直す
+    rebuild_index(updated_papers)
+    rebuild_facet_index(updated_papers)
+    backfill(PAPERS_FILE)
     logger.info("Data fix completed.")
 
 if __name__ == "__main__":
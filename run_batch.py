@@ -1,10 +1,14 @@
 import logging
 import sys
 from datetime import datetime
-from src.fetcher import fetch_papers, mark_as_processed
+from src.fetcher import fetch_papers, PROCESSED_IDS_PATH
 from src.summarizer import summarize_paper
-from src.notifier import notify_new_papers
-from src.utils import load_json, save_json
+from src.notifier import notify_new_papers, wait_for_notifications
+from src.utils import load_json, transaction
+from src.similarity import update_index
+from src.facets import update_facet_index
+from src.digest import update_rollups
+from src import metrics
 
 # ロギング設定
 logging.basicConfig(
@@ -18,12 +22,13 @@ logger = logging.getLogger(__name__)
 
 PAPERS_JSON_PATH = "data/papers.json"
 
-def main():
+def run(max_results=1):
     logger.info("Starting batch process...")
     
     # 1. Fetch Papers
     try:
-        raw_papers = fetch_papers(max_results=1)
+        with metrics.span("batch.fetch"):
+            raw_papers = fetch_papers(max_results=max_results)
     except Exception as e:
         logger.error(f"Failed to fetch papers: {e}")
         return
@@ -40,7 +45,8 @@ def main():
 
     for paper in raw_papers:
         try:
-            summary_data = summarize_paper(paper)
+            with metrics.span("batch.summarize"):
+                summary_data = summarize_paper(paper)
             # 取得日を追加
             summary_data['fetched_date'] = datetime.now().isoformat()
             summarized_papers.append(summary_data)
@@ -53,36 +59,69 @@ def main():
         logger.warning("No papers were successfully summarized.")
         return
 
-    # 3. Save Data (Append to existing)
+    # 3. Save Data (Append to existing) + Mark IDs as processed
+    # 論文と処理済みIDは1つのトランザクションで追記する (どちらか片方だけ保存されることはない)
     try:
         existing_papers = load_json(PAPERS_JSON_PATH, [])
         # 新しいものが先頭に来るようにマージする場合:
         # updated_papers = summarized_papers + existing_papers
         # あるいは単純に追加して表示側でソート。今回はリストの末尾に追加する。
         updated_papers = existing_papers + summarized_papers
-        save_json(PAPERS_JSON_PATH, updated_papers)
+        with metrics.span("batch.save_papers"):
+            with transaction() as txn:
+                txn.append(PAPERS_JSON_PATH, summarized_papers)
+                txn.append(PROCESSED_IDS_PATH, processed_ids)
         logger.info(f"Saved {len(summarized_papers)} new papers to {PAPERS_JSON_PATH}")
+        logger.info(f"Marked {len(processed_ids)} IDs as processed.")
     except Exception as e:
-        logger.error(f"Failed to save papers.json: {e}")
-        # 保存に失敗したら通知もしない方が安全かもしれないが、
-        # IDの記録だけ失敗して再通知されるのを防ぐため、ここではエラーでもID記録に進むか検討。
-        # 今回は安全倒しでリターンする（重複通知覚悟）
+        logger.error(f"Failed to save papers.json / processed_ids.json: {e}")
+        # 保存に失敗したら通知もしない (次回の実行で同じ論文を再取得する)
         return
 
-    # 4. Mark IDs as processed
+    # 4. Notify (バックグラウンドで送信し、LINE側が遅くても以降の処理を止めない)
     try:
-        mark_as_processed(processed_ids)
-        logger.info(f"Marked {len(processed_ids)} IDs as processed.")
+        notify_new_papers(summarized_papers, background=True)
     except Exception as e:
-        logger.error(f"Failed to update processed_ids.json: {e}")
+        logger.error(f"Failed to send notification: {e}")
 
-    # 5. Notify
+    # 4.5 Update related-papers / facet indexes and weekly rollups (失敗してもバッチは継続)
     try:
-        notify_new_papers(summarized_papers)
+        with metrics.span("batch.similarity_index"):
+            update_index(updated_papers)
     except Exception as e:
-        logger.error(f"Failed to send notification: {e}")
+        logger.error(f"Failed to update similarity index: {e}")
+
+    try:
+        with metrics.span("batch.facet_index"):
+            update_facet_index(updated_papers)
+    except Exception as e:
+        logger.error(f"Failed to update facet index: {e}")
+
+    try:
+        with metrics.span("batch.weekly_rollups"):
+            update_rollups(summarized_papers)
+    except Exception as e:
+        logger.error(f"Failed to update weekly rollups: {e}")
+
+    # 5. 送信中の通知を待つ (上限時間を超えたら諦める)
+    with metrics.span("batch.notify_wait"):
+        wait_for_notifications()
 
     logger.info("Batch process completed successfully.")
 
+def main(max_results=1):
+    """run() を計測付きで実行し、data/metrics/ にレポートを書き出して集計表を表示する"""
+    metrics.reset()
+    try:
+        with metrics.span("batch.total"):
+            run(max_results=max_results)
+    finally:
+        try:
+            json_path, prom_path = metrics.write_report()
+            logger.info(f"Wrote metrics to {json_path} and {prom_path}")
+        except Exception as e:
+            logger.error(f"Failed to write metrics report: {e}")
+        print(metrics.summary_table())
+
 if __name__ == "__main__":
     main()
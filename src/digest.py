@@ -0,0 +1,274 @@
+import os
+import logging
+import argparse
+from datetime import datetime, date, timedelta
+from zoneinfo import ZoneInfo
+from .utils import load_json, update_json, MONTH_ABBR
+from .facets import paper_facets
+from .notifier import send_line_broadcast
+
+# ロガーの取得
+logger = logging.getLogger(__name__)
+
+PAPERS_PATH = "data/papers.json"
+ROLLUPS_PATH = "data/digest/weekly_rollups.json"
+PAGES_DIR = "data/digest/pages"
+
+# 週ごとに保持する上位論文の件数
+TOP_N = 3
+
+DASHBOARD_URL = "https://texysqp24lkpdbdngjmfuq.streamlit.app/"
+
+# 週の区切りは日本時間で判定する (GitHub Actions のランナーは UTC)
+DIGEST_TIMEZONE = ZoneInfo("Asia/Tokyo")
+
+
+def paper_date(paper):
+    """論文の追加日 (fetched_date優先、なければpub_dateの月初) を返す"""
+    fd = paper.get('fetched_date')
+    if fd:
+        try:
+            return datetime.fromisoformat(fd).date()
+        except ValueError:
+            pass
+    parts = str(paper.get('pub_date') or '').split('-')
+    if not parts[0].isdigit():
+        return None
+    month = 1
+    if len(parts) > 1:
+        month = int(parts[1]) if parts[1].isdigit() else MONTH_ABBR.get(parts[1][:3].title(), 1)
+    return date(int(parts[0]), min(max(month, 1), 12), 1)
+
+
+def week_key(d):
+    """ISO週のキー (例: 2026-W10)"""
+    year, week, _ = d.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def week_start(key):
+    """ISO週のキーから月曜日の日付を返す"""
+    year, week = key.split("-W")
+    return date.fromisocalendar(int(year), int(week), 1)
+
+
+def _empty_rollup(key):
+    start = week_start(key)
+    return {
+        "week": key,
+        "start": start.isoformat(),
+        "end": (start + timedelta(days=6)).isoformat(),
+        "count": 0,
+        "importance": {},
+        "keywords": {},
+        "pub_types": {},
+        "top_papers": [],
+        "ids": [],
+    }
+
+
+def _top_entry(paper):
+    return {
+        "id": paper.get('id'),
+        "title_ja": paper.get('title_ja', 'No Title'),
+        "importance": paper.get('importance', 1),
+        "summary": paper.get('summary', ''),
+        "url": paper.get('url', ''),
+        "fetched_date": paper.get('fetched_date', ''),
+    }
+
+
+def _add_to_rollup(rollup, paper):
+    facets = paper_facets(paper)
+    rollup["count"] += 1
+    rollup["ids"].append(paper.get('id'))
+    for key, values in (("importance", facets["importance"]), ("keywords", facets["keyword"]), ("pub_types", facets["pub_type"])):
+        for value in values:
+            rollup[key][value] = rollup[key].get(value, 0) + 1
+
+    # 上位 TOP_N 件だけ保持 (重要度 → 新しい順)
+    top = rollup["top_papers"] + [_top_entry(paper)]
+    top.sort(key=lambda p: (p.get('importance', 0), p.get('fetched_date', '')), reverse=True)
+    rollup["top_papers"] = top[:TOP_N]
+
+
+def _add_papers(rollups, papers):
+    """未集計の論文を rollups に加算する (集計済みのIDは無視する)。追加した件数を返す。"""
+    added = 0
+    known_ids = {pid for rollup in rollups.values() for pid in rollup["ids"]}
+    for paper in papers:
+        pid = paper.get('id')
+        d = paper_date(paper)
+        if pid in known_ids or d is None:
+            continue
+        key = week_key(d)
+        if key not in rollups:
+            rollups[key] = _empty_rollup(key)
+        _add_to_rollup(rollups[key], paper)
+        known_ids.add(pid)
+        added += 1
+    return added
+
+
+def update_rollups(papers, path=ROLLUPS_PATH):
+    """
+    未集計の論文を週ごとのロールアップに加算して保存する。
+    既に集計済みのIDは無視するので、アーカイブ全体を渡してもよい。追加した件数を返す。
+    """
+    added = 0
+
+    def add_papers(rollups):
+        # 他のプロセスと競合したら読み直した rollups でやり直すので、毎回数え直す
+        nonlocal added
+        added = _add_papers(rollups, papers)
+        return dict(sorted(rollups.items())) if added else None
+
+    update_json(path, add_papers, {})
+    if added:
+        logger.info(f"Added {added} papers to weekly rollups.")
+    return added
+
+
+def backfill(papers_path=PAPERS_PATH, path=ROLLUPS_PATH):
+    """
+    アーカイブ全体から週ごとのロールアップを1パスで作り直す (配信済みの記録は引き継ぐ)。
+    集計した件数を返す。
+    """
+    papers = load_json(papers_path, [])
+    added = 0
+
+    def rebuild(rollups):
+        # メモリ上で作り直して1回の書き込みで置き換える (途中で失敗しても元のロールアップと配信記録は残る)
+        nonlocal added
+        rebuilt = {}
+        added = _add_papers(rebuilt, papers)
+        for key, rollup in rollups.items():
+            if rollup.get("sent_at") and key in rebuilt:
+                rebuilt[key]["sent_at"] = rollup["sent_at"]
+        return dict(sorted(rebuilt.items()))
+
+    update_json(path, rebuild, {})
+    logger.info(f"Rebuilt weekly rollups from {added} papers.")
+    return added
+
+
+def get_rollup(key, path=ROLLUPS_PATH):
+    return load_json(path, {}).get(key) if os.path.exists(path) else None
+
+
+def last_week_key(today=None):
+    """
+    直近の完了した週のキー (today 以前の日曜日で終わるISO週)。
+    today 省略時は日本時間の今日。週次ジョブ (月曜 8:00 JST) では前日に終わった週になる。
+    """
+    today = today or datetime.now(DIGEST_TIMEZONE).date()
+    # isoweekday: 月=1 ... 日=7 → 日曜なら今日、それ以外は直前の日曜
+    return week_key(today - timedelta(days=today.isoweekday() % 7))
+
+
+def _ranked(counts):
+    return sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))
+
+
+def render_message(rollup):
+    """LINE向けの週間ダイジェスト本文"""
+    message = f"【Anesth Update】週間ダイジェスト\n{rollup['start']} 〜 {rollup['end']}\n\n"
+    message += f"今週の新着: {rollup['count']}件\n"
+    if rollup["keywords"]:
+        message += "トピック: " + ", ".join(f"{k}({n})" for k, n in _ranked(rollup["keywords"])) + "\n"
+    message += "\n"
+
+    for i, paper in enumerate(rollup["top_papers"], start=1):
+        message += f"{i}. {paper['title_ja']} (重要度: {paper['importance']})\n"
+    message += "\n詳細はダッシュボードを確認:\n"
+    message += DASHBOARD_URL
+    return message
+
+
+def render_page(rollup):
+    """週間ダイジェストのページ (Markdown)"""
+    lines = [
+        f"# Weekly Digest {rollup['week']}",
+        "",
+        f"{rollup['start']} 〜 {rollup['end']} / 新着 {rollup['count']}件",
+        "",
+        "## Top Papers",
+        "",
+    ]
+    for paper in rollup["top_papers"]:
+        stars = "★" * int(paper['importance'])
+        lines += [
+            f"### [{paper['title_ja']}]({paper['url']})",
+            "",
+            f"**Importance:** {stars}",
+            "",
+            paper['summary'],
+            "",
+        ]
+
+    lines += ["## Breakdown", ""]
+    for title, key in (("Importance", "importance"), ("Keywords", "keywords"), ("Publication Types", "pub_types")):
+        if rollup[key]:
+            lines.append(f"- **{title}:** " + ", ".join(f"{k} ({n})" for k, n in _ranked(rollup[key])))
+    return "\n".join(lines) + "\n"
+
+
+def write_page(rollup, pages_dir=PAGES_DIR):
+    path = os.path.join(pages_dir, f"{rollup['week']}.md")
+    os.makedirs(pages_dir, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(render_page(rollup))
+    logger.info(f"Wrote weekly digest page to {path}")
+    return path
+
+
+def send_weekly_digest(key=None, path=ROLLUPS_PATH, force=False):
+    """指定週 (省略時は先週) のダイジェストをページに書き出し、LINEで配信する"""
+    key = key or last_week_key()
+    rollups = load_json(path, {}) if os.path.exists(path) else {}
+    rollup = rollups.get(key)
+    if not rollup or not rollup["count"]:
+        logger.info(f"No papers in week {key}. Skipping digest.")
+        return False
+    if rollup.get("sent_at") and not force:
+        logger.info(f"Digest for {key} was already sent at {rollup['sent_at']}.")
+        return False
+
+    write_page(rollup)
+    if not send_line_broadcast(render_message(rollup)):
+        return False
+
+    sent_at = datetime.now().isoformat()
+
+    def mark_sent(rollups):
+        # 送信中に日次バッチが rollups を更新していても、その変更を消さないように読み直して書く
+        if key in rollups:
+            rollups[key]["sent_at"] = sent_at
+        return rollups
+
+    update_json(path, mark_sent, {})
+    return True
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Weekly digest")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("backfill", help="rebuild weekly rollups from data/papers.json")
+    for name in ("render", "send"):
+        p = sub.add_parser(name, help=f"{name} the digest for a week (default: last week)")
+        p.add_argument("--week", help="ISO week such as 2026-W10")
+        if name == "send":
+            p.add_argument("--force", action="store_true", help="send even if already sent")
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        backfill()
+    else:
+        # 日次バッチで取りこぼした論文があれば先に集計する
+        update_rollups(load_json(PAPERS_PATH, []))
+        if args.command == "render":
+            rollup = get_rollup(args.week or last_week_key())
+            print(render_message(rollup) if rollup else "No papers in that week.")
+        else:
+            send_weekly_digest(args.week, force=args.force)
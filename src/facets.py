@@ -0,0 +1,210 @@
+import os
+import re
+import logging
+import numpy as np
+from .fetcher import KEYWORDS, PUBLICATION_TYPES
+from .utils import load_json, save_json, month_key, data_lock
+
+# ロガーの取得
+logger = logging.getLogger(__name__)
+
+# 絞り込み用の転置インデックス
+# facet -> 値 -> 該当論文のPMID (昇順の整数配列)
+FACETS_PATH = "data/index/facets.json"
+FACETS = ("keyword", "importance", "month", "pub_type")
+
+def _keyword_chunks(keyword):
+    return re.findall(r"[a-z]+|[0-9]+", keyword.lower())
+
+def _keyword_pattern(keyword):
+    # "SGLT2" が "SGLT-2" / "SGLT 2" にも、"Video Laryngoscope" が複数形にもマッチするようにする
+    return re.compile(r"\b" + r"[\s\-]*".join(_keyword_chunks(keyword)))
+
+KEYWORD_PATTERNS = {k: _keyword_pattern(k) for k in KEYWORDS}
+# 正規表現を試す前に探す、各キーワードの先頭の語 ("glp", "video" など)
+KEYWORD_LITERALS = {k: _keyword_chunks(k)[0] for k in KEYWORDS}
+
+# pub_types を持たない古いデータ向けに、英語タイトルから Publication Type を推定する
+PUB_TYPE_TITLE_HINTS = {
+    "Guideline": re.compile(r"guideline|recommendation", re.I),
+    "Consensus Development Conference": re.compile(r"consensus", re.I),
+    "Meta-Analysis": re.compile(r"meta-?analys", re.I),
+    "Systematic Review": re.compile(r"systematic review", re.I),
+    "Review": re.compile(r"review", re.I),
+}
+
+
+def matched_keywords(text, keywords=KEYWORDS):
+    """
+    小文字化済みの text に含まれる注目キーワード (keywords のうち) の一覧。
+    Abstract 全体に正規表現をかけると遅いので、先頭の語が見つかった位置でだけ照合する。
+    """
+    found = []
+    for keyword in keywords:
+        pattern, literal = KEYWORD_PATTERNS[keyword], KEYWORD_LITERALS[keyword]
+        pos = text.find(literal)
+        while pos != -1:
+            if pattern.match(text, pos):
+                found.append(keyword)
+                break
+            pos = text.find(literal, pos + 1)
+    return found
+
+
+def paper_facets(paper):
+    """論文が属する facet の値を {facet: [値, ...]} で返す"""
+    title = paper.get('original_title') or paper.get('title') or ""
+    text = f"{title} {paper.get('abstract', '')}".lower()
+
+    pub_types = [t for t in paper.get('pub_types') or [] if t in PUBLICATION_TYPES]
+    if not paper.get('pub_types'):
+        pub_types = [t for t, hint in PUB_TYPE_TITLE_HINTS.items() if hint.search(title)]
+
+    return {
+        "keyword": matched_keywords(text),
+        "importance": [str(paper.get('importance', 1))],
+        "month": [month_key(paper)],
+        "pub_type": pub_types,
+    }
+
+
+def _pmid(paper):
+    try:
+        return int(paper.get('id'))
+    except (TypeError, ValueError):
+        return None
+
+
+class FacetIndex:
+    """facet ごとのPMID配列を持ち、複数条件の絞り込みを集合演算で行う"""
+
+    def __init__(self, ids=None, postings=None):
+        self.ids = np.asarray(ids if ids is not None else [], dtype=np.int64)
+        self.postings = {facet: {} for facet in FACETS}
+        for facet, values in (postings or {}).items():
+            for value, pmids in values.items():
+                self.postings.setdefault(facet, {})[value] = np.asarray(pmids, dtype=np.int64)
+
+    @classmethod
+    def from_papers(cls, papers):
+        index = cls()
+        index.add(papers)
+        return index
+
+    @classmethod
+    def load(cls, path=FACETS_PATH):
+        """保存済みインデックスを読み込む。存在しない場合は None を返す。"""
+        if not os.path.exists(path):
+            return None
+        data = load_json(path, {})
+        if "ids" not in data:
+            return None
+        return cls(data["ids"], data.get("postings", {}))
+
+    def save(self, path=FACETS_PATH):
+        save_json(path, {
+            "ids": self.ids.tolist(),
+            "postings": {
+                facet: {value: pmids.tolist() for value, pmids in sorted(values.items())}
+                for facet, values in self.postings.items()
+            },
+        })
+
+    def __contains__(self, paper_id):
+        try:
+            pmid = int(paper_id)
+        except (TypeError, ValueError):
+            return False
+        pos = np.searchsorted(self.ids, pmid)
+        return pos < len(self.ids) and self.ids[pos] == pmid
+
+    def add(self, papers):
+        """未登録の論文を追加する。追加した件数を返す。"""
+        grouped = {facet: {} for facet in FACETS}
+        new_ids = []
+        seen = set()
+        for paper in papers:
+            pmid = _pmid(paper)
+            if pmid is None:
+                logger.warning(f"Skipping paper with non-numeric id: {paper.get('id')}")
+                continue
+            if pmid in seen or pmid in self:
+                continue
+            seen.add(pmid)
+            new_ids.append(pmid)
+            for facet, values in paper_facets(paper).items():
+                for value in values:
+                    grouped[facet].setdefault(value, []).append(pmid)
+
+        if not new_ids:
+            return 0
+
+        self.ids = np.union1d(self.ids, new_ids)
+        for facet, values in grouped.items():
+            postings = self.postings.setdefault(facet, {})
+            for value, pmids in values.items():
+                postings[value] = np.union1d(postings.get(value, np.empty(0, dtype=np.int64)), pmids)
+        return len(new_ids)
+
+    def values(self, facet):
+        """facet の値一覧 (件数の多い順)"""
+        postings = self.postings.get(facet, {})
+        return sorted(postings, key=lambda v: (-len(postings[v]), v))
+
+    def count(self, facet, value):
+        return len(self.postings.get(facet, {}).get(value, ()))
+
+    def query(self, selections):
+        """
+        selections = {facet: [値, ...]} に一致する論文のPMID配列を返す。
+        同じ facet 内は OR、facet 間は AND。値が空の facet は条件なしとして扱う。
+        """
+        matched = []
+        for facet, values in selections.items():
+            if not values:
+                continue
+            postings = self.postings.get(facet, {})
+            arrays = [postings[v] for v in values if v in postings]
+            if not arrays:
+                return np.empty(0, dtype=np.int64)
+            matched.append(np.unique(np.concatenate(arrays)) if len(arrays) > 1 else arrays[0])
+
+        if not matched:
+            return self.ids
+
+        # 小さい集合から順に積集合をとる
+        matched.sort(key=len)
+        result = matched[0]
+        for pmids in matched[1:]:
+            result = np.intersect1d(result, pmids, assume_unique=True)
+            if not len(result):
+                break
+        return result
+
+
+def rebuild_facet_index(papers, path=FACETS_PATH):
+    """全論文から転置インデックスを作り直す"""
+    with data_lock(os.path.dirname(path)):
+        index = FacetIndex.from_papers(papers)
+        index.save(path)
+        logger.info(f"Rebuilt facet index with {len(index.ids)} papers.")
+        return index
+
+
+def update_facet_index(papers, path=FACETS_PATH):
+    """未登録の論文だけを転置インデックスに追加して保存する (読み込みから保存までロックを取る)"""
+    with data_lock(os.path.dirname(path)):
+        index = FacetIndex.load(path)
+        if index is None:
+            return rebuild_facet_index(papers, path)
+        added = index.add(papers)
+        if added:
+            index.save(path)
+            logger.info(f"Added {added} papers to facet index.")
+        return index
+
+
+if __name__ == "__main__":
+    # インデックスの全再構築
+    logging.basicConfig(level=logging.INFO)
+    rebuild_facet_index(load_json("data/papers.json", []))
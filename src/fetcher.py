@@ -4,7 +4,8 @@ from dotenv import load_dotenv
 import pandas as pd
 from datetime import datetime
 import logging
-from .utils import load_json, save_json
+from .utils import load_json, append_json, normalize_title
+from .metrics import span, incr
 
 # ロガーの取得
 logger = logging.getLogger(__name__)
@@ -15,6 +16,28 @@ Entrez.email = os.getenv("EMAIL")
 
 PROCESSED_IDS_PATH = "data/processed_ids.json"
 
+# 注目キーワード (検索クエリ・ダッシュボードの絞り込みで共用)
+KEYWORDS = [
+    "GLP-1", "SGLT2", "Video Laryngoscope",
+    "Regional Anesthesia", "POCUS", "Frailty"
+]
+
+# 対象とする Publication Type (検索クエリ・ダッシュボードの絞り込みで共用)
+PUBLICATION_TYPES = [
+    "Guideline", "Consensus Development Conference", "Meta-Analysis",
+    "Systematic Review", "Review"
+]
+
+def build_title_index(papers):
+    """既存論文の正規化済み英語タイトルの集合 (タイトル重複チェック用)"""
+    existing_titles = set()
+    for p in papers:
+        # papers.json has 'original_title'
+        ot = p.get('original_title')
+        if ot:
+            existing_titles.add(normalize_title(ot))
+    return existing_titles
+
 def fetch_papers(max_results=5):
     """
     PubMedから論文を取得し、重複を除外して返す。
@@ -28,14 +51,10 @@ def fetch_papers(max_results=5):
     base_query = '(Anesthesiology[Title/Abstract] OR "Perioperative care"[Title/Abstract])'
     
     # Important Keywords (OR condition)
-    keywords = [
-        '"GLP-1"', '"SGLT2"', '"Video Laryngoscope"', 
-        '"Regional Anesthesia"', '"POCUS"', '"Frailty"'
-    ]
-    keywords_query = "(" + " OR ".join(keywords) + ")"
+    keywords_query = "(" + " OR ".join(f'"{k}"' for k in KEYWORDS) + ")"
     
     # Publication Types / Focus (AND condition)
-    types_query = '(Guideline[Publication Type] OR "Consensus Development Conference"[Publication Type] OR "Meta-Analysis"[Publication Type] OR "Systematic Review"[Publication Type] OR "Review"[Publication Type])'
+    types_query = "(" + " OR ".join(f'"{t}"[Publication Type]' for t in PUBLICATION_TYPES) + ")"
     
     # Exclusions (NOT condition)
     exclusions = '(NOT "Animals"[MeSH Terms] NOT "Case Reports"[Publication Type])'
@@ -52,25 +71,29 @@ def fetch_papers(max_results=5):
 
     try:
         # 2. ID検索 (reldate=365 で過去1年)
-        handle = Entrez.esearch(
-            db="pubmed",
-            term=final_query,
-            retmax=100,  # 重複排除用にある程度多く取得
-            reldate=365,
-            datetype="pdat",
-            sort="relevance" # 関連度順
-        )
-        record = Entrez.read(handle)
+        with span("fetch.esearch"):
+            handle = Entrez.esearch(
+                db="pubmed",
+                term=final_query,
+                retmax=max(100, max_results),  # 重複排除用にある程度多く取得
+                reldate=365,
+                datetype="pdat",
+                sort="relevance" # 関連度順
+            )
+        with span("fetch.esearch_parse"):
+            record = Entrez.read(handle)
         handle.close()
         
         id_list = record["IdList"]
         logger.info(f"Found {len(id_list)} papers.")
+        incr("fetch.found", len(id_list))
         
         # 3. 重複排除
         processed_ids = load_json(PROCESSED_IDS_PATH, [])
         new_ids = [pid for pid in id_list if pid not in processed_ids]
         
         logger.info(f"New papers after duplicate check: {len(new_ids)}")
+        incr("fetch.new", len(new_ids))
         
         if not new_ids:
             return []
@@ -79,31 +102,22 @@ def fetch_papers(max_results=5):
         target_ids = new_ids[:max_results]
         
     # 4. 詳細取得
-        handle = Entrez.efetch(
-            db="pubmed",
-            id=target_ids,
-            rettype="medline",
-            retmode="xml"
-        )
-        papers_xml = Entrez.read(handle)
+        with span("fetch.efetch"):
+            handle = Entrez.efetch(
+                db="pubmed",
+                id=target_ids,
+                rettype="medline",
+                retmode="xml"
+            )
+        # 本文のダウンロードは Entrez.read の中で行われるため、解析の時間に含まれる
+        with span("fetch.efetch_parse"):
+            papers_xml = Entrez.read(handle)
         handle.close()
         
         # タイトル重複チェック用
         existing_papers = load_json("data/papers.json", [])
         
-        def normalize_title(t):
-            if not t: return ""
-            import re
-            s = t.lower()
-            s = re.sub(r'[^a-z0-9]', '', s)
-            return s
-
-        existing_titles = set()
-        for p in existing_papers:
-            # papers.json has 'original_title'
-            ot = p.get('original_title')
-            if ot:
-                existing_titles.add(normalize_title(ot))
+        existing_titles = build_title_index(existing_papers)
         
         papers_data = []
         if 'PubmedArticle' not in papers_xml:
@@ -146,29 +160,32 @@ def fetch_papers(max_results=5):
             except:
                 pub_date_str = "Unknown"
 
+            # Publication Type (Guideline, Meta-Analysis など)
+            pub_types = [str(t) for t in article_data.get('PublicationTypeList', [])]
+
             papers_data.append({
                 "id": pmid,
                 "title": title,
                 "abstract": abstract_text,
                 "pub_date": pub_date_str,
+                "pub_types": pub_types,
                 "url": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
             })
         
         if skipped_count > 0:
             logger.info(f"Skipped {skipped_count} papers due to title duplication.")
+            incr("fetch.duplicate_titles", skipped_count)
             
         return papers_data
 
     except Exception as e:
         logger.error(f"Error occurred during fetching papers: {e}")
+        incr("fetch.errors")
         return []
 
 def mark_as_processed(paper_ids):
-    """処理済みIDを保存する"""
-    processed_ids = load_json(PROCESSED_IDS_PATH, [])
-    # 重複を避けて追加
-    updated_ids = list(set(processed_ids + paper_ids))
-    save_json(PROCESSED_IDS_PATH, updated_ids)
+    """処理済みIDを保存する (既にあるIDは追記時に除かれる)"""
+    append_json(PROCESSED_IDS_PATH, list(paper_ids))
 
 if __name__ == "__main__":
     # for testing
@@ -0,0 +1,176 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from .utils import save_json, atomic_write
+
+# バッチ1回分の計測値 (スパン・カウンター・ヒストグラム) をプロセス内に保持し、
+# data/metrics/ に JSON (実行ごと) と Prometheus textfile (最新) で書き出す
+METRICS_DIR = "data/metrics"
+PROM_FILENAME = "batch.prom"
+PROM_PREFIX = "anesth_batch"
+
+# ヒストグラムのバケット (秒)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_lock = threading.Lock()
+_spans = {}
+_counters = {}
+_histograms = {}
+_started_at = None
+
+
+def reset():
+    """計測値を初期化して、新しい実行の計測を始める"""
+    global _started_at
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _histograms.clear()
+        _started_at = datetime.now()
+
+
+def incr(name, value=1):
+    """カウンターを加算する"""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name, value):
+    """ヒストグラムに値を記録する"""
+    with _lock:
+        _histograms.setdefault(name, []).append(value)
+
+
+@contextmanager
+def span(name):
+    """
+    with span("fetch.esearch"):
+        ...
+    の所要時間を記録する。例外が出た場合は "<name>.errors" カウンターも加算する。
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        incr(f"{name}.errors")
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            _spans.setdefault(name, []).append(elapsed)
+
+
+def percentile(values, q):
+    """nearest-rank 法のパーセンタイル (values が空なら 0.0)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))  # ceil
+    return ordered[int(rank) - 1]
+
+
+def _stats(values):
+    return {
+        "count": len(values),
+        "sum": sum(values),
+        "min": min(values),
+        "max": max(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "buckets": {str(b): sum(1 for v in values if v <= b) for b in DEFAULT_BUCKETS},
+    }
+
+
+def snapshot():
+    """現在の計測値を dict で返す"""
+    with _lock:
+        spans = {name: _stats(values) for name, values in _spans.items()}
+        histograms = {name: _stats(values) for name, values in _histograms.items()}
+        counters = dict(_counters)
+        started_at = _started_at
+    finished_at = datetime.now()
+    return {
+        "started_at": started_at.isoformat() if started_at else None,
+        "finished_at": finished_at.isoformat(),
+        "duration": (finished_at - started_at).total_seconds() if started_at else None,
+        "spans": spans,
+        "counters": counters,
+        "histograms": histograms,
+    }
+
+
+def _metric_name(name):
+    return "".join(c if c.isalnum() else "_" for c in name).lower()
+
+
+def _prom_histogram(lines, metric, stats, labels=""):
+    sep = "," if labels else ""
+    for bucket, count in stats["buckets"].items():
+        lines.append(f'{metric}_bucket{{{labels}{sep}le="{bucket}"}} {count}')
+    lines.append(f'{metric}_bucket{{{labels}{sep}le="+Inf"}} {stats["count"]}')
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{metric}_sum{suffix} {stats['sum']:.6f}")
+    lines.append(f"{metric}_count{suffix} {stats['count']}")
+
+
+def to_prometheus(snap):
+    """Prometheus textfile 形式に変換する (node_exporter の textfile collector 向け)"""
+    lines = []
+    if snap["spans"]:
+        metric = f"{PROM_PREFIX}_stage_seconds"
+        lines += [f"# HELP {metric} Duration of batch stages.", f"# TYPE {metric} histogram"]
+        for name, stats in sorted(snap["spans"].items()):
+            _prom_histogram(lines, metric, stats, f'stage="{name}"')
+
+    for name, value in sorted(snap["counters"].items()):
+        metric = f"{PROM_PREFIX}_{_metric_name(name)}_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+
+    for name, stats in sorted(snap["histograms"].items()):
+        metric = f"{PROM_PREFIX}_{_metric_name(name)}"
+        lines.append(f"# TYPE {metric} histogram")
+        _prom_histogram(lines, metric, stats)
+
+    if snap["duration"] is not None:
+        lines += [
+            f"# TYPE {PROM_PREFIX}_run_duration_seconds gauge",
+            f"{PROM_PREFIX}_run_duration_seconds {snap['duration']:.6f}",
+            f"# TYPE {PROM_PREFIX}_last_run_timestamp_seconds gauge",
+            f"{PROM_PREFIX}_last_run_timestamp_seconds {datetime.fromisoformat(snap['finished_at']).timestamp():.0f}",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def write_report(metrics_dir=METRICS_DIR, snap=None):
+    """
+    data/metrics/run-YYYYmmdd-HHMMSS.json (実行ごと) と batch.prom (最新の実行) を書き出す。
+    書き出したパスを (json, prom) で返す。
+    """
+    snap = snap or snapshot()
+    stamp = datetime.fromisoformat(snap["started_at"] or snap["finished_at"]).strftime("%Y%m%d-%H%M%S")
+    json_path = os.path.join(metrics_dir, f"run-{stamp}.json")
+    prom_path = os.path.join(metrics_dir, PROM_FILENAME)
+
+    save_json(json_path, snap)
+    # textfile collector が書きかけのファイルを読まないよう、一時ファイルから置き換える
+    # (一時ファイル名は実行ごとに異なるので、重なった実行同士でも衝突しない)
+    text = to_prometheus(snap)
+    atomic_write(prom_path, lambda f: f.write(text))
+    return json_path, prom_path
+
+
+def summary_table(snap=None):
+    """スパン・カウンターの一覧を表形式の文字列にする"""
+    snap = snap or snapshot()
+    lines = [f"{'stage':<28}{'count':>7}{'total s':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"]
+    for name, s in snap["spans"].items():
+        lines.append(f"{name:<28}{s['count']:>7}{s['sum']:>10.2f}{s['p50'] * 1000:>10.1f}"
+                     f"{s['p95'] * 1000:>10.1f}{s['max'] * 1000:>10.1f}")
+    if snap["counters"]:
+        lines.append("")
+        lines.append(f"{'counter':<28}{'value':>7}")
+        for name, value in sorted(snap["counters"].items()):
+            lines.append(f"{name:<28}{value:>7}")
+    return "\n".join(lines)
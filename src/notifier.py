@@ -1,7 +1,13 @@
 import os
-import requests
+import time
+import uuid
+import random
 import logging
+import requests
+from concurrent.futures import ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
+from .metrics import span, incr, observe
 
 # ロガーの設定
 logger = logging.getLogger(__name__)
@@ -9,71 +15,227 @@ logger = logging.getLogger(__name__)
 # 環境変数の読み込み
 load_dotenv()
 LINE_CHANNEL_ACCESS_TOKEN = os.getenv("LINE_CHANNEL_ACCESS_TOKEN")
-LINE_MESSAGING_API_BROADCAST = "https://api.line.me/v2/bot/message/broadcast"
+# テスト時はローカルのスタブサーバー (fakes/line_server.py) に向ける
+LINE_API_BASE = os.getenv("LINE_API_BASE", "https://api.line.me").rstrip("/")
+LINE_MESSAGING_API_BROADCAST = f"{LINE_API_BASE}/v2/bot/message/broadcast"
+LINE_MESSAGING_API_PUSH = f"{LINE_API_BASE}/v2/bot/message/push"
+LINE_MESSAGING_API_MULTICAST = f"{LINE_API_BASE}/v2/bot/message/multicast"
+
+# Messaging API の制限
+MAX_MESSAGES_PER_REQUEST = 5      # 1リクエストあたりの吹き出し数
+MAX_MULTICAST_RECIPIENTS = 500    # multicast 1回あたりの宛先数
+MAX_TEXT_LENGTH = 5000            # テキストメッセージの最大文字数
+
+# タイムアウトとリトライ
+REQUEST_TIMEOUT = (3.05, 10)      # (接続, 読み込み) 秒
+MAX_RETRIES = 3
+BACKOFF_BASE = 1.0                # 1, 2, 4 秒 ... + ジッター
+MAX_RETRY_WAIT = 10               # Retry-After が長すぎる場合もこれ以上は待たない
+RETRY_STATUS = (429, 500, 502, 503, 504)
+# 1回の送信処理全体の上限 (LINE側が遅い・混雑していてもバッチを止めない)
+SEND_DEADLINE = 60
+
+_session = None
+_executor = None
+_pending = []
+
+
+def get_session():
+    """コネクションを使い回すための requests.Session (プロセス内で共有)"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        _session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+    return _session
+
+
+def text_message(text):
+    """テキストメッセージオブジェクトを作る (上限文字数で切り詰め)"""
+    if len(text) > MAX_TEXT_LENGTH:
+        text = text[:MAX_TEXT_LENGTH - 1] + "…"
+    return {"type": "text", "text": text}
 
-def send_line_broadcast(text):
-    """LINE Messaging API (Broadcast) でメッセージを送信する"""
-    if not LINE_CHANNEL_ACCESS_TOKEN:
-        logger.warning("LINE_CHANNEL_ACCESS_TOKEN is not set. Skipping notification.")
-        return
 
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _retry_wait(response, attempt):
+    # 429 は Retry-After を優先、それ以外は指数バックオフ + ジッター
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        wait_sec = float(retry_after)
+    else:
+        wait_sec = BACKOFF_BASE * (2 ** attempt) + random.uniform(0, BACKOFF_BASE)
+    return min(wait_sec, MAX_RETRY_WAIT)
+
+
+def _post(url, payload, deadline):
+    """
+    LINE API に POST する。429/5xx と通信エラーはバックオフしてリトライし、
+    deadline (time.monotonic() の値) を過ぎたら諦める。成功したら True を返す。
+    """
     headers = {
         "Authorization": f"Bearer {LINE_CHANNEL_ACCESS_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    
-    # Messaging API payload
-    data = {
-        "messages": [
-            {
-                "type": "text",
-                "text": text
-            }
-        ]
+        "Content-Type": "application/json",
+        # リトライで同じメッセージが二重送信されないようにする
+        "X-Line-Retry-Key": str(uuid.uuid4()),
     }
-    
-    try:
-        response = requests.post(LINE_MESSAGING_API_BROADCAST, headers=headers, json=data)
-        response.raise_for_status()
-        logger.info("LINE broadcast sent successfully.")
-    except Exception as e:
-        logger.error(f"Failed to send LINE broadcast: {e}")
-        if 'response' in locals() and hasattr(response, 'text'):
-            logger.error(f"API Response: {response.text}")
-
-def notify_new_papers(summarized_papers):
-    """新規論文の通知メッセージを作成して送信する"""
-    if not summarized_papers:
-        logger.info("No new papers to notify.")
-        return
 
-    # Count papers
-    count = len(summarized_papers)
-    
+    for attempt in range(MAX_RETRIES + 1):
+        response = None
+        try:
+            with span("notify.line_request"):
+                response = get_session().post(url, headers=headers, json=payload, timeout=REQUEST_TIMEOUT)
+            # 409: 同じ Retry-Key のリクエストは既に受理済み
+            if response.ok or response.status_code == 409:
+                return True
+            if response.status_code not in RETRY_STATUS:
+                logger.error(f"LINE API error {response.status_code}: {response.text}")
+                incr("notify.failures")
+                return False
+            logger.warning(f"LINE API returned {response.status_code} (attempt {attempt + 1}/{MAX_RETRIES + 1})")
+        except requests.RequestException as e:
+            logger.warning(f"LINE API request failed: {e} (attempt {attempt + 1}/{MAX_RETRIES + 1})")
+
+        if attempt == MAX_RETRIES:
+            break
+        wait_sec = _retry_wait(response, attempt)
+        if time.monotonic() + wait_sec >= deadline:
+            logger.error("LINE API send deadline exceeded. Giving up.")
+            incr("notify.failures")
+            return False
+        incr("notify.retries")
+        observe("notify.retry_wait_seconds", wait_sec)
+        time.sleep(wait_sec)
+
+    if response is not None:
+        logger.error(f"API Response: {response.text}")
+    incr("notify.failures")
+    return False
+
+
+def send_messages(messages, to=None, deadline=None):
+    """
+    メッセージオブジェクトのリストを送信する。
+    - to が None なら broadcast、1件なら push、複数なら multicast (500件ずつに分割)
+    - メッセージは1リクエスト5件ずつまとめて送る
+    すべて成功したら True を返す。
+    """
+    if not LINE_CHANNEL_ACCESS_TOKEN:
+        logger.warning("LINE_CHANNEL_ACCESS_TOKEN is not set. Skipping notification.")
+        return False
+    if not messages:
+        return True
+
+    if deadline is None:
+        deadline = time.monotonic() + SEND_DEADLINE
+
+    if to is None:
+        requests_to_send = [(LINE_MESSAGING_API_BROADCAST, {})]
+    else:
+        recipients = [to] if isinstance(to, str) else list(dict.fromkeys(to))
+        if len(recipients) == 1:
+            requests_to_send = [(LINE_MESSAGING_API_PUSH, {"to": recipients[0]})]
+        else:
+            requests_to_send = [
+                (LINE_MESSAGING_API_MULTICAST, {"to": segment})
+                for segment in _chunks(recipients, MAX_MULTICAST_RECIPIENTS)
+            ]
+
+    success = True
+    for url, target in requests_to_send:
+        for batch in _chunks(messages, MAX_MESSAGES_PER_REQUEST):
+            if time.monotonic() >= deadline:
+                logger.error("LINE API send deadline exceeded. Remaining messages were not sent.")
+                return False
+            success &= _post(url, {**target, "messages": batch}, deadline)
+
+    if success:
+        logger.info(f"LINE messages sent successfully ({len(messages)} messages, {len(requests_to_send)} target(s)).")
+    return success
+
+
+def send_line_broadcast(text):
+    """LINE Messaging API (Broadcast) でメッセージを送信する"""
+    return send_messages([text_message(text)])
+
+
+def send_messages_async(messages, to=None):
+    """
+    send_messages をバックグラウンドスレッドで実行し Future を返す。
+    完了待ちは wait_for_notifications() で行う。
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="line-notifier")
+    future = _executor.submit(send_messages, messages, to, time.monotonic() + SEND_DEADLINE)
+    _pending.append(future)
+    return future
+
+
+def wait_for_notifications(timeout=SEND_DEADLINE):
+    """送信中のバックグラウンド通知を最大 timeout 秒待つ。未完了の件数を返す。"""
+    if not _pending:
+        return 0
+    done, not_done = wait(list(_pending), timeout=timeout)
+    for future in done:
+        _pending.remove(future)
+        if future.exception():
+            logger.error(f"Failed to send notification: {future.exception()}")
+    if not_done:
+        logger.warning(f"{len(not_done)} notification(s) still in progress after {timeout}s.")
+    return len(not_done)
+
+
+def build_new_papers_messages(summarized_papers):
+    """新規論文の通知メッセージ (吹き出しのリスト) を作成する"""
     # Sort by importance descending
-    summarized_papers.sort(key=lambda x: x.get('importance', 0), reverse=True)
-    top_paper = summarized_papers[0]
+    papers = sorted(summarized_papers, key=lambda x: x.get('importance', 0), reverse=True)
+    top_paper = papers[0]
 
     # メッセージ作成
     # Header
     message = f"【Anesth Update】今日のピックアップ\n\n"
-    
+
     # Top Paper Info
     title = top_paper.get('title_ja', 'No Title')
     importance = top_paper.get('importance', '?')
-    action = top_paper.get('clinical_action', 'N/A')
-    
+
     # シンプルな表示に変更
     message += f"■ {title} (重要度: {importance})\n\n"
     # Clinical Actionは長くなるためLINEではSummaryを表示し、詳細はダッシュボードへ誘導
     summary = top_paper.get('summary', 'N/A')
     message += f"要約:\n{summary}\n\n"
-    
+
     # Footer
-    # 注: Messaging APIは1つの吹き出しで最大2000文字等の制限があるが、
-    # この程度の分量ならまず問題ない。
     message += "詳細はダッシュボードを確認:\n"
     # ※デプロイ後は実際のURL (例: https://appname.streamlit.app) に書き換えてください
-    message += "https://texysqp24lkpdbdngjmfuq.streamlit.app/" 
-    
-    send_line_broadcast(message)
+    message += "https://texysqp24lkpdbdngjmfuq.streamlit.app/"
+
+    messages = [text_message(message)]
+
+    # 2件目以降は1吹き出しずつ追加 (1リクエストにまとめて送る)
+    for paper in papers[1:MAX_MESSAGES_PER_REQUEST]:
+        messages.append(text_message(
+            f"■ {paper.get('title_ja', 'No Title')} (重要度: {paper.get('importance', '?')})\n\n"
+            f"{paper.get('summary', 'N/A')}"
+        ))
+    return messages
+
+
+def notify_new_papers(summarized_papers, to=None, background=False):
+    """
+    新規論文の通知メッセージを作成して送信する。
+    background=True の場合は送信を待たずに Future を返す。
+    """
+    if not summarized_papers:
+        logger.info("No new papers to notify.")
+        return None
+
+    messages = build_new_papers_messages(summarized_papers)
+    if background:
+        return send_messages_async(messages, to)
+    return send_messages(messages, to)
@@ -0,0 +1,110 @@
+import io
+import os
+import time
+import pstats
+import cProfile
+from contextlib import contextmanager
+from datetime import datetime
+from .metrics import percentile
+
+# ダッシュボード (app.py) の再描画ごとの区間計測。既定では無効で、
+#   APP_PROFILE=1 streamlit run app.py   または   http://localhost:8501/?profile=1
+# で有効になる。計測値は st.session_state に直近 WINDOW 回分だけ保持する。
+PROFILE_ENV = "APP_PROFILE"
+PROFILE_QUERY_PARAM = "profile"
+PROFILE_DIR = "profiles"
+WINDOW = 20
+
+TIMINGS_KEY = "render_timings"
+CPROFILE_KEY = "render_cprofile"
+
+
+def is_enabled(query_params=None):
+    """環境変数またはクエリパラメータでプロファイリングが有効になっているか"""
+    if os.getenv(PROFILE_ENV, "").lower() in ("1", "true", "yes"):
+        return True
+    return bool(query_params) and query_params.get(PROFILE_QUERY_PARAM, "") in ("1", "true")
+
+
+class RenderProfiler:
+    """
+    profiler = RenderProfiler(st.session_state, enabled=is_enabled(st.query_params))
+    with profiler.section("sort"):
+        ...
+    profiler.finish()  # try/finally で必ず呼ぶ
+
+    区間は入れ子にでき、それぞれ内側の区間を含む時間を記録する。
+    同じ名前の区間が1回の再描画で複数回呼ばれた場合は合計する。
+    無効な場合は何も記録しない。
+    """
+
+    def __init__(self, state, enabled=False, window=WINDOW):
+        self.state = state
+        self.enabled = enabled
+        self.window = window
+        self.timings = {}
+        self.stats_path = None
+        self._start = time.perf_counter()
+        self._profile = None
+        if enabled and state.get(CPROFILE_KEY):
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    @contextmanager
+    def section(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def finish(self):
+        """
+        今回の再描画の計測を session_state の履歴に追加する (cProfile 有効時は .pstats も書き出す)。
+        st.rerun() や例外で再描画が中断されても呼ばれるよう、呼び出し側は try/finally で使う。
+        """
+        if not self.enabled:
+            return
+        try:
+            self.timings["total"] = time.perf_counter() - self._start
+            history = self.state.get(TIMINGS_KEY, [])
+            self.state[TIMINGS_KEY] = (history + [self.timings])[-self.window:]
+        finally:
+            if self._profile is not None:
+                self._profile.disable()
+                # 記録は1回だけ: チェックを外さないと以降の再描画ごとに .pstats が増える
+                # (チェックボックスより前に呼ばれるので、ここでの書き換えはウィジェットに反映される)
+                self.state[CPROFILE_KEY] = False
+                profile, self._profile = self._profile, None
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                self.stats_path = os.path.join(PROFILE_DIR, f"app-{datetime.now().strftime('%Y%m%d-%H%M%S')}.pstats")
+                profile.dump_stats(self.stats_path)
+
+    def summary(self):
+        """直近の再描画について区間ごとの [last, mean, p95, max] (ミリ秒) を返す"""
+        history = self.state.get(TIMINGS_KEY, [])
+        names = []
+        for timings in history:
+            names += [name for name in timings if name not in names]
+
+        rows = {}
+        for name in names:
+            values = [t[name] * 1000 for t in history if name in t]
+            rows[name] = {
+                "last": history[-1].get(name, 0.0) * 1000,
+                "mean": sum(values) / len(values),
+                "p95": percentile(values, 95),
+                "max": max(values),
+            }
+        return rows, len(history)
+
+    def top_functions(self, limit=15, sort_key="cumulative"):
+        """書き出した .pstats の上位関数をテキストで返す"""
+        if not self.stats_path:
+            return ""
+        stream = io.StringIO()
+        pstats.Stats(self.stats_path, stream=stream).strip_dirs().sort_stats(sort_key).print_stats(limit)
+        return stream.getvalue()
@@ -0,0 +1,260 @@
+import os
+import re
+import json
+import math
+import zlib
+import hashlib
+import logging
+import numpy as np
+from .utils import load_json, atomic_write, data_lock
+
+# ロガーの取得
+logger = logging.getLogger(__name__)
+
+# 類似論文インデックスの保存先
+# - similarity-<digest>.f32: 行 = 論文, 列 = ハッシュ化した語彙 (float32, L2正規化済みTF-IDF)
+#   digest は行順のID一覧から求めるので、ID一覧が変われば別のファイルになる
+# - similarity_meta.json: 行順のID一覧・文書頻度(df)・対応する行列ファイル名
+# メタ情報の置き換えで新しい行列に切り替わるので、行列とID一覧の組が食い違うことはない
+INDEX_DIR = "data/index"
+MATRIX_FILENAME = "similarity-{digest}.f32"
+META_FILENAME = "similarity_meta.json"
+
+# ハッシュ空間の次元数 (1論文あたり 2048 * 4byte = 8KB)
+N_FEATURES = 2048
+DTYPE = np.float32
+
+# インデックス構築時から文書数がこの倍率を超えたら IDF が古くなったとみなして全再構築する
+REBUILD_FACTOR = 1.5
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+STOPWORDS = frozenset("""
+a about after all also among an and any are as at be been before between both but by can could
+did do does during each either for from had has have however if in into is it its may more most
+no not of on or other our over such than that the their them then there these they this those
+through to under up was we were what when where whether which while who will with within would
+""".split())
+
+
+def tokenize(text):
+    """英文を小文字化して単語に分割する (ストップワード・1文字語は除外)"""
+    if not text:
+        return []
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def _hash_token(token):
+    # Python組み込みの hash() はプロセスごとに変わるため crc32 を使う
+    return zlib.crc32(token.encode("utf-8")) % N_FEATURES
+
+
+def term_counts(paper):
+    """original_title + abstract をハッシュ化した語彙ごとの出現回数 {列: 回数} にする"""
+    # fetcher直後の形式では英語タイトルは 'title' にある
+    title = paper.get('original_title') or paper.get('title') or ""
+    text = f"{title} {paper.get('abstract', '')}"
+    counts = {}
+    for token in tokenize(text):
+        col = _hash_token(token)
+        counts[col] = counts.get(col, 0) + 1
+    return counts
+
+
+def _idf(df, n_docs):
+    # smooth idf: log((1 + n) / (1 + df)) + 1
+    return (np.log((1.0 + n_docs) / (1.0 + np.asarray(df, dtype=np.float64))) + 1.0).astype(DTYPE)
+
+
+def _vectorize(counts_list, idf):
+    """出現回数の一覧を L2 正規化済み TF-IDF 行列 (len x N_FEATURES) にする"""
+    matrix = np.zeros((len(counts_list), N_FEATURES), dtype=DTYPE)
+    for row, counts in enumerate(counts_list):
+        if not counts:
+            continue
+        cols = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        tf = np.fromiter((1.0 + math.log(c) for c in counts.values()), dtype=DTYPE, count=len(counts))
+        matrix[row, cols] = tf * idf[cols]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def build_matrix(papers):
+    """論文一覧から (ids, 行列, df) をメモリ上で構築する"""
+    counts_list = [term_counts(p) for p in papers]
+    df = np.zeros(N_FEATURES, dtype=np.int64)
+    for counts in counts_list:
+        if counts:
+            df[list(counts.keys())] += 1
+    matrix = _vectorize(counts_list, _idf(df, len(papers)))
+    ids = [str(p.get('id')) for p in papers]
+    return ids, matrix, df
+
+
+def matrix_filename(ids):
+    """行順のID一覧に対応する行列ファイル名"""
+    digest = hashlib.sha1("\n".join(ids).encode("utf-8")).hexdigest()[:16]
+    return MATRIX_FILENAME.format(digest=digest)
+
+
+def _meta_path(index_dir):
+    return os.path.join(index_dir, META_FILENAME)
+
+
+def _write_index(index_dir, meta, write_matrix):
+    """
+    ロックを取った状態で呼ぶ。行列を新しいファイルに書いてからメタ情報を置き換え、
+    使われなくなった行列ファイルを消す。どちらの書き込みも失敗時は例外を送出する。
+    """
+    # ダッシュボードが memory-map している行列ファイルをその場で書き換えると、
+    # 読み手が SIGBUS で落ちるため、常に新しいファイルに書く
+    meta["matrix"] = matrix_filename(meta["ids"])
+    atomic_write(os.path.join(index_dir, meta["matrix"]), write_matrix, binary=True)
+    atomic_write(_meta_path(index_dir), lambda f: json.dump(meta, f, ensure_ascii=False, indent=2))
+    for name in os.listdir(index_dir):
+        if name.startswith("similarity") and name.endswith(".f32") and name != meta["matrix"]:
+            os.remove(os.path.join(index_dir, name))
+
+
+def rebuild_index(papers, index_dir=INDEX_DIR):
+    """全論文からインデックスを作り直す"""
+    with data_lock(index_dir):
+        ids, matrix, df = build_matrix(papers)
+        meta = {
+            "n_features": N_FEATURES,
+            "n_docs_at_build": len(ids),
+            "ids": ids,
+            "df": df.tolist(),
+        }
+        _write_index(index_dir, meta, lambda f: f.write(matrix.tobytes()))
+        logger.info(f"Rebuilt similarity index with {len(ids)} papers.")
+        return len(ids)
+
+
+def update_index(papers, index_dir=INDEX_DIR):
+    """
+    未登録の論文だけをベクトル化して行列ファイルの末尾に追記する。
+    IDF はインデックス構築時のものを df の更新込みで使い回し、
+    文書数が REBUILD_FACTOR 倍を超えたら全再構築する。
+    メタ情報の読み込みから書き込みまでロックを取り、並行する再構築 (fix_data.py) と
+    行の並び (行番号 → ID の対応) が食い違わないようにする。
+    """
+    with data_lock(index_dir):
+        meta_path = _meta_path(index_dir)
+        meta = load_json(meta_path, {}) if os.path.exists(meta_path) else {}
+        matrix_path = os.path.join(index_dir, meta.get("matrix") or "")
+
+        if (not meta or meta.get("n_features") != N_FEATURES
+                or meta.get("matrix") != matrix_filename(meta.get("ids", [])) or not os.path.exists(matrix_path)):
+            return rebuild_index(papers, index_dir)
+
+        known_ids = set(meta["ids"])
+        new_papers = [p for p in papers if str(p.get('id')) not in known_ids]
+        if not new_papers:
+            logger.info("Similarity index is up to date.")
+            return 0
+
+        n_docs = len(meta["ids"]) + len(new_papers)
+        if n_docs > meta.get("n_docs_at_build", 0) * REBUILD_FACTOR:
+            return rebuild_index(papers, index_dir)
+
+        counts_list = [term_counts(p) for p in new_papers]
+        df = np.asarray(meta["df"], dtype=np.int64)
+        for counts in counts_list:
+            if counts:
+                df[list(counts.keys())] += 1
+        rows = _vectorize(counts_list, _idf(df, n_docs))
+
+        # 既存の行をコピーした新しいファイルに追記する。memory-map されている元のファイルは変更しない
+        row_bytes = N_FEATURES * np.dtype(DTYPE).itemsize
+
+        n_known = len(meta["ids"])
+
+        def write_matrix(f):
+            remaining = n_known * row_bytes
+            with open(matrix_path, 'rb') as src:
+                while remaining > 0:
+                    chunk = src.read(min(remaining, 1 << 20))
+                    if not chunk:
+                        raise ValueError(f"Similarity index is truncated: {matrix_path}")
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            f.write(rows.tobytes())
+
+        meta["ids"] = meta["ids"] + [str(p.get('id')) for p in new_papers]
+        meta["df"] = df.tolist()
+        _write_index(index_dir, meta, write_matrix)
+        logger.info(f"Appended {len(new_papers)} papers to similarity index.")
+        return len(new_papers)
+
+
+class SimilarityIndex:
+    """行列ファイルを memory-map して top-k のコサイン類似度検索を行う"""
+
+    def __init__(self, ids, matrix):
+        self.ids = list(ids)
+        self.matrix = matrix
+        self._row_of = {pid: i for i, pid in enumerate(self.ids)}
+
+    @classmethod
+    def load(cls, index_dir=INDEX_DIR):
+        """
+        保存済みインデックスを開く。存在しない・壊れている場合、
+        メタ情報の ID 一覧と行列ファイルが対応していない場合は None を返す。
+        """
+        meta_path = _meta_path(index_dir)
+        if not os.path.exists(meta_path):
+            return None
+        meta = load_json(meta_path, {})
+        ids = meta.get("ids", [])
+        if meta.get("n_features") != N_FEATURES or not ids:
+            return None
+        if meta.get("matrix") != matrix_filename(ids):
+            logger.warning(f"Similarity index does not match its ids: {meta_path}")
+            return None
+        matrix_path = os.path.join(index_dir, meta["matrix"])
+        row_bytes = N_FEATURES * np.dtype(DTYPE).itemsize
+        try:
+            size = os.path.getsize(matrix_path)
+            if size != len(ids) * row_bytes:
+                logger.warning(f"Similarity index has {size // row_bytes} rows for {len(ids)} ids: {matrix_path}")
+                return None
+            matrix = np.memmap(matrix_path, dtype=DTYPE, mode='r', shape=(len(ids), N_FEATURES))
+        except FileNotFoundError:
+            # メタ情報を読んだ後に更新され、古い行列ファイルが消された
+            return None
+        return cls(ids, matrix)
+
+    @classmethod
+    def from_papers(cls, papers):
+        """ファイルを使わずメモリ上で構築する (インデックス未作成時のフォールバック)"""
+        ids, matrix, _ = build_matrix(papers)
+        return cls(ids, matrix)
+
+    def __contains__(self, paper_id):
+        return str(paper_id) in self._row_of
+
+    def __len__(self):
+        return len(self.ids)
+
+    def related(self, paper_id, k=5, min_score=0.0):
+        """paper_id に類似する論文を [(id, score), ...] で類似度の高い順に返す"""
+        row = self._row_of.get(str(paper_id))
+        if row is None:
+            return []
+        scores = np.asarray(self.matrix @ self.matrix[row])
+        scores[row] = -1.0  # 自分自身は除外
+        k = min(k, len(self.ids) - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top if scores[i] > min_score]
+
+
+if __name__ == "__main__":
+    # インデックスの全再構築
+    logging.basicConfig(level=logging.INFO)
+    rebuild_index(load_json("data/papers.json", []))
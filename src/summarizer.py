@@ -5,6 +5,7 @@ import time
 from google import genai
 from google.genai import types
 from dotenv import load_dotenv
+from .metrics import span, incr
 
 # ロガーの設定
 logger = logging.getLogger(__name__)
@@ -12,6 +13,11 @@ logger = logging.getLogger(__name__)
 # 環境変数の読み込み
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# テスト時はローカルのスタブサーバー (fakes/gemini_server.py) に向ける
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+
+# APIのRate Limit考慮 (1件ごとの待ち時間, 秒)
+RATE_LIMIT_SLEEP = 1
 
 def summarize_paper(paper):
     """
@@ -21,7 +27,8 @@ def summarize_paper(paper):
     if not GEMINI_API_KEY:
         raise ValueError("GEMINI_API_KEY is required.")
 
-    client = genai.Client(api_key=GEMINI_API_KEY)
+    http_options = types.HttpOptions(base_url=GEMINI_BASE_URL) if GEMINI_BASE_URL else None
+    client = genai.Client(api_key=GEMINI_API_KEY, http_options=http_options)
     
     # モデル設定
     # ユーザー環境で利用可能な最新モデルを指定
@@ -51,15 +58,16 @@ Abstract: {paper['abstract']}
         logger.info(f"Summarizing paper: {paper['id']} with {model_name}")
         
         # https://github.com/googleapis/python-genai
-        response = client.models.generate_content(
-            model=model_name,
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                system_instruction=system_instruction,
-                response_mime_type="application/json",
-                temperature=0.2
+        with span("summarize.gemini"):
+            response = client.models.generate_content(
+                model=model_name,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    system_instruction=system_instruction,
+                    response_mime_type="application/json",
+                    temperature=0.2
+                )
             )
-        )
         
         # Parse JSON
         # response.text should contain the JSON string
@@ -71,14 +79,17 @@ Abstract: {paper['abstract']}
         result['id'] = paper['id']
         result['pub_date'] = paper['pub_date']
         result['abstract'] = paper.get('abstract', '')
+        result['pub_types'] = paper.get('pub_types', [])
+        incr("summarize.ok")
         
         # APIのRate Limit考慮
-        time.sleep(1) 
+        time.sleep(RATE_LIMIT_SLEEP)
         
         return result
 
     except Exception as e:
         logger.error(f"Failed to summarize paper {paper['id']}: {e}")
+        incr("summarize.errors")
         return {
             "title_ja": "要約エラー",
             "summary": "要約の生成に失敗しました。",
@@ -88,5 +99,6 @@ Abstract: {paper['abstract']}
             "url": paper['url'],
             "id": paper['id'],
             "pub_date": paper['pub_date'],
-            "abstract": paper.get('abstract', '')
+            "abstract": paper.get('abstract', ''),
+            "pub_types": paper.get('pub_types', [])
         }
@@ -0,0 +1,154 @@
+import os
+import sys
+import logging
+import pandas as pd
+from .utils import load_json, month_key
+from .facets import KEYWORD_PATTERNS, PUB_TYPE_TITLE_HINTS, matched_keywords
+
+# ロガーの取得
+logger = logging.getLogger(__name__)
+
+PAPERS_PATH = "data/papers.json"
+PARQUET_PATH = "data/papers.parquet"
+
+# papers.json のキー -> 列の型
+# 文字列は Arrow の文字列配列、繰り返しの多い日付・重要度はカテゴリ型にしてメモリを抑える
+STRING_COLUMNS = [
+    "id", "title_ja", "summary", "clinical_action",
+    "original_title", "abstract", "url", "fetched_date",
+]
+CATEGORY_COLUMNS = ["pub_date", "month"]
+IMPORTANCE_LEVELS = [1, 2, 3, 4, 5]
+STRING_DTYPE = "string[pyarrow]"
+
+
+def _apply_dtypes(df):
+    for col in STRING_COLUMNS:
+        df[col] = df[col].astype(STRING_DTYPE)
+    df["pub_date"] = df["pub_date"].fillna("Unknown")
+    for col in CATEGORY_COLUMNS:
+        df[col] = df[col].astype("category")
+
+    importance = pd.to_numeric(df["importance"], errors="coerce").fillna(1).clip(1, 5).astype(int)
+    df["importance"] = pd.Categorical(importance, categories=IMPORTANCE_LEVELS, ordered=True)
+
+    df["pub_types"] = [list(t) if t is not None and not isinstance(t, float) else [] for t in df["pub_types"]]
+    return df
+
+
+def papers_to_frame(papers):
+    """論文(dict)のリストを列指向の DataFrame に変換する"""
+    df = pd.DataFrame.from_records(papers, columns=STRING_COLUMNS + ["pub_date", "importance", "pub_types"])
+    df["month"] = [month_key(p) for p in papers]
+    return _apply_dtypes(df)
+
+
+def frame_to_papers(df):
+    """DataFrame を papers.json と同じ形式の dict のリストに戻す (欠損値のキーは省く)"""
+    records = []
+    for row in df.drop(columns=["month"], errors="ignore").to_dict("records"):
+        paper = {k: v for k, v in row.items() if not (v is None or (not isinstance(v, list) and pd.isna(v)))}
+        if "importance" in paper:
+            paper["importance"] = int(paper["importance"])
+        if not paper.get("pub_types"):
+            paper.pop("pub_types", None)
+        records.append(paper)
+    return records
+
+
+def load_table(path=PAPERS_PATH):
+    """papers.json または Parquet ファイルから DataFrame を読み込む"""
+    if path.endswith(".parquet"):
+        return _apply_dtypes(pd.read_parquet(path))
+    return papers_to_frame(load_json(path, []))
+
+
+def export_parquet(df, path=PARQUET_PATH):
+    """DataFrame を Parquet 形式で保存する"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    df.to_parquet(path, index=False)
+    logger.info(f"Exported {len(df)} papers to {path}")
+
+
+def sort_order(df):
+    """新しい順 (fetched_date優先、なければpub_date) に並べたときの行位置の配列"""
+    pub_date = df["pub_date"].astype(STRING_DTYPE).replace("Unknown", pd.NA)
+    sort_key = df["fetched_date"].fillna(pub_date).fillna("0000-00-00").reset_index(drop=True)
+    return sort_key.sort_values(ascending=False, kind="stable").index.to_numpy()
+
+
+def sort_papers(df):
+    """新しい順に並べる (fetched_date優先、なければpub_date)"""
+    return df.take(sort_order(df))
+
+
+def group_by_month(df):
+    """
+    {YYYY-MM: 行ラベルの配列} を月の降順で返す ("Others" は最後)。
+    月ごとの DataFrame を作るとコストが大きいので、必要なら df.loc[rows] で取り出す。
+    """
+    groups = df.groupby("month", observed=True, sort=False).indices
+    months = sorted(groups, key=lambda m: (m != "Others", m), reverse=True)
+    return {month: df.index[groups[month]] for month in months}
+
+
+def keyword_hits(df, keywords=None):
+    """
+    行 x 注目キーワード の bool 表 (タイトルまたはAbstractに含むか)。keywords が None なら全キーワード。
+    本文の結合・小文字化とキーワード照合は1行につき1回だけ行うので、
+    filter_papers / topic_trend を繰り返し呼ぶ場合は一度求めた表を hits として渡す。
+    """
+    keywords = list(KEYWORD_PATTERNS) if keywords is None else list(keywords)
+    titles = df["original_title"].fillna("").tolist()
+    abstracts = df["abstract"].fillna("").tolist()
+    matched = [matched_keywords(f"{t} {a}".lower(), keywords) for t, a in zip(titles, abstracts)]
+    return pd.DataFrame({k: [k in m for m in matched] for k in keywords}, index=df.index, dtype=bool)
+
+
+def keyword_mask(df, keyword):
+    """タイトルまたはAbstractに keyword (fetcherの注目キーワード) を含む行"""
+    return keyword_hits(df, [keyword])[keyword]
+
+
+def filter_papers(df, importance=None, months=None, keywords=None, pub_types=None, hits=None):
+    """
+    条件に一致する行を返す (各条件内はOR、条件間はAND。None は条件なし)。
+    hits は keyword_hits(df) の結果 (省略時は keywords の分だけ求める)。
+    """
+    mask = pd.Series(True, index=df.index)
+    if importance:
+        mask &= df["importance"].isin(importance)
+    if months:
+        mask &= df["month"].isin(months)
+    if keywords:
+        if hits is None:
+            hits = keyword_hits(df, keywords)
+        mask &= hits[list(keywords)].any(axis=1)
+    if pub_types:
+        wanted = set(pub_types)
+        has_types = df["pub_types"].map(bool)
+        type_hit = df["pub_types"].map(lambda types: not wanted.isdisjoint(types))
+        # pub_types を持たない古いデータはタイトルから推定する (facets.paper_facets と同じ規則)
+        title = df["original_title"].fillna("")
+        for pub_type in wanted & PUB_TYPE_TITLE_HINTS.keys():
+            type_hit |= ~has_types & title.str.contains(PUB_TYPE_TITLE_HINTS[pub_type].pattern, case=False, regex=True)
+        mask &= type_hit
+    return df[mask]
+
+
+def importance_trend(df):
+    """月 x 重要度 の件数表"""
+    return pd.crosstab(df["month"], df["importance"]).sort_index()
+
+
+def topic_trend(df, hits=None):
+    """月 x 注目キーワード の件数表 (hits は keyword_hits(df) の結果)"""
+    if hits is None:
+        hits = keyword_hits(df)
+    return hits.groupby(df["month"], observed=True).sum().sort_index()
+
+
+if __name__ == "__main__":
+    # papers.json を Parquet にエクスポート: python -m src.table [出力先]
+    logging.basicConfig(level=logging.INFO)
+    export_parquet(load_table(PAPERS_PATH), sys.argv[1] if len(sys.argv) > 1 else PARQUET_PATH)
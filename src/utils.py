@@ -1,6 +1,19 @@
 import json
 import os
+import re
+import copy
+import time
+import uuid
 import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows ではプロセス間ロックなし
+    fcntl = None
 
 # ロギングの設定
 logging.basicConfig(
@@ -9,15 +22,35 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 追記専用の書き込み先 (papers.json / processed_ids.json) は全体を書き直さず、
+# 同じディレクトリの journal.jsonl に1行1トランザクションで追記する。
+# load_json は読み込み時にジャーナルを反映し、一定量たまったら本体へ反映 (compaction) する。
+JOURNAL_FILENAME = "journal.jsonl"
+JOURNAL_MAX_ENTRIES = 20
+JOURNAL_MAX_BYTES = 1024 * 1024
+
+# 同じディレクトリに書き込むプロセス (日次バッチ・週次ダイジェスト・fix_data.py) の排他制御。
+# ロックは書き込みの瞬間だけ取り、読み込み〜加工の間は取らない。代わりにファイルごとの
+# バージョン (.versions.json) を比べ、他のプロセスが先に書き込んでいたら再適用またはマージする。
+LOCK_FILENAME = ".data.lock"
+LOCK_TIMEOUT = 30
+LOCK_POLL_INTERVAL = 0.05
+VERSIONS_FILENAME = ".versions.json"
+UPDATE_RETRIES = 3
+
 def load_json(filepath: str, default=None):
-    """JSONファイルを読み込む。ファイルがない場合はdefaultを返す。"""
+    """JSONファイルを読み込む。ファイルがない場合はdefaultを返す。ジャーナルに追記分があれば反映する。"""
+    # ジャーナルを先に読む (本体を読む前に compaction されても追記分を取りこぼさない)
+    pending = _pending_appends(filepath)
     if not os.path.exists(filepath):
+        if pending:
+            return _apply_appends(default if default is not None else [], pending)
         logger.warning(f"File not found: {filepath}. Returning default value.")
         return default if default is not None else []
     
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
+            data = json.load(f)
     except json.JSONDecodeError as e:
         logger.error(f"Failed to decode JSON from {filepath}: {e}")
         return default if default is not None else []
@@ -25,14 +58,385 @@ def load_json(filepath: str, default=None):
         logger.error(f"Error loading JSON from {filepath}: {e}")
         return default if default is not None else []
 
+    return _apply_appends(data, pending) if pending and isinstance(data, list) else data
+
+def _fsync_dir(dirpath: str):
+    """rename を永続化するためにディレクトリを fsync する (対応していないOSでは何もしない)"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(dirpath or ".", os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def atomic_write(filepath: str, write, binary: bool = False):
+    """
+    同じディレクトリの一時ファイルに書き込み、fsync してから rename で置き換える。
+    途中で落ちても元のファイルはそのまま残り、元のファイルを開いている (memory-map している)
+    読み手も古い内容を読み続けられる。binary=True ならバイナリモードで書く。失敗時は例外を送出する。
+    """
+    dirpath = os.path.dirname(filepath)
+    os.makedirs(dirpath or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dirpath or ".", prefix=f".{os.path.basename(filepath)}.", suffix=".tmp")
+    try:
+        with (os.fdopen(fd, 'wb') if binary else os.fdopen(fd, 'w', encoding='utf-8')) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _fsync_dir(dirpath)
+
+def _dump(data):
+    return lambda f: json.dump(data, f, ensure_ascii=False, indent=2)
+
 def save_json(filepath: str, data: any):
-    """データをJSONファイルに保存する。"""
+    """データをJSONファイルに保存する (一時ファイル + fsync + rename で原子的に置き換える)。"""
     try:
-        # ディレクトリがない場合は作成
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        with data_lock(os.path.dirname(filepath)):
+            _write_versioned(filepath, data)
         logger.info(f"Successfully saved data to {filepath}")
     except Exception as e:
         logger.error(f"Failed to save JSON to {filepath}: {e}")
+
+def _write_versioned(filepath: str, data: any):
+    """ロックを取った状態で呼ぶ。本体を置き換えてバージョンを進める。"""
+    atomic_write(filepath, _dump(data))
+    # 全体を書き直したので、このファイル宛てのジャーナルは不要
+    _drop_journal_entries(filepath)
+    _bump_versions(os.path.dirname(filepath), [os.path.basename(filepath)])
+
+class LockTimeout(TimeoutError):
+    pass
+
+_held_locks = threading.local()
+
+@contextmanager
+def data_lock(dirpath: str = "data", timeout: float = LOCK_TIMEOUT):
+    """
+    ディレクトリ単位の排他ロック (flock)。timeout 秒以内に取れなければ LockTimeout を送出する。
+    同じスレッド内では入れ子にできる。
+    """
+    os.makedirs(dirpath or ".", exist_ok=True)
+    lock_path = os.path.abspath(os.path.join(dirpath or ".", LOCK_FILENAME))
+    held = _held_locks.__dict__.setdefault("paths", set())
+    if lock_path in held or fcntl is None:
+        yield
+        return
+
+    with open(lock_path, 'a') as f:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise LockTimeout(f"Timed out after {timeout}s waiting for {lock_path}")
+                time.sleep(LOCK_POLL_INTERVAL)
+        held.add(lock_path)
+        try:
+            yield
+        finally:
+            held.discard(lock_path)
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def _read_versions(dirpath: str) -> dict:
+    try:
+        with open(os.path.join(dirpath or ".", VERSIONS_FILENAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _bump_versions(dirpath: str, names: list):
+    versions = _read_versions(dirpath)
+    for name in names:
+        versions[name] = versions.get(name, 0) + 1
+    atomic_write(os.path.join(dirpath or ".", VERSIONS_FILENAME), _dump(versions))
+
+def file_version(filepath: str) -> int:
+    """ファイルのバージョン (書き込み・追記のたびに1つ進む)"""
+    return _read_versions(os.path.dirname(filepath)).get(os.path.basename(filepath), 0)
+
+def _load_strict(filepath: str, default=None):
+    """
+    書き換える前の読み込み。load_json と同じくジャーナルを反映するが、ファイルが壊れている
+    (マージ競合の印が残っているなど) 場合は default を返さずに例外を送出する。
+    default から作り直した内容で元のデータを上書きしないようにするため。
+    """
+    pending = _pending_appends(filepath)
+    if not os.path.exists(filepath):
+        if pending:
+            return _apply_appends(default if default is not None else [], pending)
+        return default
+    data = _read_base(filepath)
+    return _apply_appends(data, pending) if pending and isinstance(data, list) else data
+
+def load_json_versioned(filepath: str, default=None):
+    """
+    (データ, バージョン) を返す。save_json_merged に渡して競合を検出する。
+    書き戻す前提の読み込みなので、ファイルが壊れていれば例外を送出する。
+    """
+    # バージョンを先に読む (データより新しいバージョンを掴んで競合を見逃すことがないように)
+    version = file_version(filepath)
+    return _load_strict(filepath, default), version
+
+def merge_json(base, ours, theirs):
+    """
+    base から ours に加工している間に、他のプロセスが theirs に更新していた場合の3方向マージ。
+    - リスト: ours に、theirs で新しく追加された要素 (id で判定) を末尾に足す
+    - 辞書: theirs に、ours で変更したキーを上書きする (同じキーは ours を優先)
+    """
+    if isinstance(ours, list) and isinstance(theirs, list):
+        known = {_item_key(item) for item in base or []} | {_item_key(item) for item in ours}
+        return ours + [item for item in theirs if _item_key(item) not in known]
+    if isinstance(ours, dict) and isinstance(theirs, dict):
+        base = base or {}
+        merged = dict(theirs)
+        for key, value in ours.items():
+            if key not in base or base[key] != value:
+                merged[key] = value
+        for key in base:
+            if key not in ours and theirs.get(key) == base[key]:
+                merged.pop(key, None)
+        return merged
+    return ours
+
+def save_json_merged(filepath: str, data: any, base: any, version: int):
+    """
+    load_json_versioned で読んだ時点から変更されていなければそのまま保存し、
+    他のプロセスが書き込んでいたら merge_json で取り込んでから保存する。保存した内容を返す。
+    """
+    with data_lock(os.path.dirname(filepath)):
+        if file_version(filepath) != version:
+            logger.warning(f"{filepath} was modified by another process. Merging changes.")
+            data = merge_json(base, data, _load_strict(filepath, copy.deepcopy(base)))
+        _write_versioned(filepath, data)
+    logger.info(f"Successfully saved data to {filepath}")
+    return data
+
+def update_json(filepath: str, update, default=None, retries: int = UPDATE_RETRIES):
+    """
+    load → update(data) → save を楽観的に行う。update は新しいデータ (変更なしなら None) を返す。
+    保存の直前にバージョンを確認し、他のプロセスが先に書き込んでいたら読み直して update をやり直す。
+    retries 回続けて競合したら、最後はロックを取ったまま行う。保存した内容 (または None) を返す。
+    ファイルがあるのに読めない場合は default で上書きせず、例外を送出して中断する。
+    """
+    def attempt():
+        return update(_load_strict(filepath, copy.deepcopy(default)))
+
+    dirpath = os.path.dirname(filepath)
+    for _ in range(retries):
+        version = file_version(filepath)
+        data = attempt()
+        if data is None:
+            return None
+        with data_lock(dirpath):
+            if file_version(filepath) == version:
+                _write_versioned(filepath, data)
+                logger.info(f"Successfully saved data to {filepath}")
+                return data
+        logger.info(f"{filepath} was modified by another process. Retrying update.")
+
+    with data_lock(dirpath):
+        data = attempt()
+        if data is not None:
+            _write_versioned(filepath, data)
+            logger.info(f"Successfully saved data to {filepath}")
+        return data
+
+def _journal_path(filepath: str) -> str:
+    return os.path.join(os.path.dirname(filepath), JOURNAL_FILENAME)
+
+def _read_journal(journal_path: str) -> list:
+    """ジャーナルのエントリ一覧。書き込み途中で落ちた行 (JSONとして壊れた行) は読み飛ばす。"""
+    if not os.path.exists(journal_path):
+        return []
+    entries = []
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping incomplete journal entry in {journal_path}")
+    return entries
+
+def _pending_appends(filepath: str) -> list:
+    """ジャーナルに記録された filepath 宛ての追記 (古い順)"""
+    name = os.path.basename(filepath)
+    try:
+        entries = _read_journal(_journal_path(filepath))
+    except Exception as e:
+        logger.error(f"Error reading journal for {filepath}: {e}")
+        return []
+    return [item for entry in entries for item in entry.get("appends", {}).get(name, [])]
+
+def _item_key(item):
+    """追記の重複判定キー (論文は id、それ以外は値そのもの)"""
+    if isinstance(item, dict):
+        return ("id", item["id"]) if "id" in item else json.dumps(item, sort_keys=True)
+    return item if isinstance(item, (str, int, float)) else json.dumps(item, sort_keys=True)
+
+def _apply_appends(data: list, items: list) -> list:
+    """
+    items を data の末尾に追加する。既に含まれているものは追加しないので、
+    compaction の途中で落ちてジャーナルが残っても二重に反映されない。
+    """
+    seen = {_item_key(item) for item in data}
+    merged = list(data)
+    for item in items:
+        key = _item_key(item)
+        if key not in seen:
+            seen.add(key)
+            merged.append(item)
+    return merged
+
+def _read_base(filepath: str) -> list:
+    """compaction / 更新前の読み込み。壊れたファイルを [] で上書きしないよう、失敗時は例外を送出する。"""
+    if not os.path.exists(filepath):
+        return []
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _rewrite_journal(journal_path: str, entries: list):
+    if entries:
+        atomic_write(journal_path, lambda f: f.writelines(json.dumps(e, ensure_ascii=False) + "\n" for e in entries))
+    elif os.path.exists(journal_path):
+        os.remove(journal_path)
+        _fsync_dir(os.path.dirname(journal_path))
+
+def _drop_journal_entries(filepath: str):
+    journal_path = _journal_path(filepath)
+    if not os.path.exists(journal_path):
+        return
+    name = os.path.basename(filepath)
+    entries = _read_journal(journal_path)
+    remaining = []
+    for entry in entries:
+        appends = {k: v for k, v in entry.get("appends", {}).items() if k != name}
+        if appends:
+            remaining.append(dict(entry, appends=appends))
+    if any(name in e.get("appends", {}) for e in entries):
+        _rewrite_journal(journal_path, remaining)
+
+def compact_journal(dirpath: str = "data"):
+    """ジャーナルの追記を各ファイル本体に反映し、ジャーナルを空にする"""
+    with data_lock(dirpath):
+        _compact_journal(dirpath)
+
+def _compact_journal(dirpath: str):
+    journal_path = os.path.join(dirpath, JOURNAL_FILENAME)
+    entries = _read_journal(journal_path)
+    if not entries:
+        return
+    names = []
+    for entry in entries:
+        names += [name for name in entry.get("appends", {}) if name not in names]
+    # 本体を先に置き換え、最後にジャーナルを消す (途中で落ちても再実行で同じ結果になる)
+    for name in names:
+        filepath = os.path.join(dirpath, name)
+        items = [item for entry in entries for item in entry.get("appends", {}).get(name, [])]
+        atomic_write(filepath, _dump(_apply_appends(_read_base(filepath), items)))
+    _rewrite_journal(journal_path, [])
+    logger.info(f"Compacted {len(entries)} journal entries into {', '.join(names)}")
+
+class Transaction:
+    """
+    複数ファイルへの追記をまとめて1回の書き込み (ジャーナル1行 + fsync) で確定する。
+    追記は他のプロセスの書き込みと衝突しないので、バージョンの確認はしない。
+
+    with transaction() as txn:
+        txn.append("data/papers.json", new_papers)
+        txn.append("data/processed_ids.json", new_ids)
+
+    対象ファイルは同じディレクトリ (ジャーナルを共有する) に置かれている必要がある。
+    """
+
+    def __init__(self):
+        self.appends = {}
+        self.dirpath = None
+
+    def append(self, filepath: str, items: list):
+        dirpath = os.path.dirname(filepath)
+        if self.dirpath is None:
+            self.dirpath = dirpath
+        elif dirpath != self.dirpath:
+            raise ValueError(f"All files in a transaction must share a directory: {filepath}")
+        self.appends.setdefault(os.path.basename(filepath), []).extend(items)
+
+    def commit(self):
+        """ジャーナルに追記して fsync する。失敗時は例外を送出する。"""
+        if not any(self.appends.values()):
+            return
+        os.makedirs(self.dirpath or ".", exist_ok=True)
+        journal_path = os.path.join(self.dirpath, JOURNAL_FILENAME)
+        entry = {"txn": uuid.uuid4().hex, "ts": datetime.now().isoformat(), "appends": self.appends}
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+
+        with data_lock(self.dirpath):
+            with open(journal_path, 'ab+') as f:
+                # 前回書き込み途中で落ちた行があれば、新しい行とつながらないように改行で区切る
+                f.seek(0, os.SEEK_END)
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        line = "\n" + line
+                f.write(line.encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+            _bump_versions(self.dirpath, list(self.appends))
+            logger.info(f"Committed {sum(len(v) for v in self.appends.values())} records to {journal_path}")
+
+            if (len(_read_journal(journal_path)) >= JOURNAL_MAX_ENTRIES
+                    or os.path.getsize(journal_path) >= JOURNAL_MAX_BYTES):
+                # ジャーナルへの追記は確定済みなので、compaction の失敗で commit を失敗扱いにしない
+                # (本体が壊れている場合などはジャーナルを残し、次回以降に再試行する)
+                try:
+                    _compact_journal(self.dirpath)
+                except Exception as e:
+                    logger.error(f"Failed to compact journal {journal_path}: {e}")
+
+@contextmanager
+def transaction():
+    """with ブロックを正常に抜けたら Transaction を commit する"""
+    txn = Transaction()
+    yield txn
+    txn.commit()
+
+def append_json(filepath: str, items: list):
+    """リスト形式のJSONファイルに items を追記する (1件のトランザクション)"""
+    with transaction() as txn:
+        txn.append(filepath, items)
+
+MONTH_ABBR = {m: i for i, m in enumerate(
+    ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], start=1)}
+
+def month_key(paper: dict) -> str:
+    """論文の年月キー (YYYY-MM) を返す。fetched_date優先、なければpub_date ("2025-Oct" 等) から求める。"""
+    fd = paper.get('fetched_date')
+    if fd:
+        try:
+            return datetime.fromisoformat(fd).strftime("%Y-%m")
+        except ValueError:
+            pass
+
+    # PubMedの出版日は "2025-Oct", "2025-Sep-03", "2026", "2025-10-01" など形式がばらつく
+    parts = str(paper.get('pub_date') or '').split('-')
+    if len(parts) >= 2 and parts[0].isdigit():
+        month = MONTH_ABBR.get(parts[1][:3].title()) or (int(parts[1]) if parts[1].isdigit() else None)
+        if month and 1 <= month <= 12:
+            return f"{parts[0]}-{month:02d}"
+    return "Others"
+
+def normalize_title(t: str) -> str:
+    """タイトル重複チェック用に小文字化して英数字以外を除去する"""
+    if not t: return ""
+    s = t.lower()
+    s = re.sub(r'[^a-z0-9]', '', s)
+    return s
@@ -0,0 +1,98 @@
+import json
+from datetime import date
+
+import pytest
+
+from src import digest
+from src.digest import last_week_key, update_rollups, backfill, send_weekly_digest
+
+
+@pytest.mark.parametrize("today, expected", [
+    (date(2026, 3, 15), "2026-W11"),  # 日曜 (UTC で週次ジョブが起動する日)
+    (date(2026, 3, 16), "2026-W11"),  # 月曜 (日本時間で週次ジョブが起動する日)
+    (date(2026, 3, 18), "2026-W11"),
+    (date(2026, 3, 14), "2026-W10"),  # 土曜はまだ W11 が終わっていない
+    (date(2026, 1, 4), "2026-W01"),   # ISO週の年またぎ
+])
+def test_last_week_key_is_latest_completed_week(today, expected):
+    assert last_week_key(today) == expected
+
+
+def _paper(pid, fetched_date, importance=3):
+    return {"id": pid, "title_ja": f"論文{pid}", "original_title": f"Frailty study {pid}",
+            "importance": importance, "fetched_date": fetched_date}
+
+
+@pytest.fixture
+def paths(tmp_path):
+    papers_path = tmp_path / "data" / "papers.json"
+    papers_path.parent.mkdir()
+    papers_path.write_text(json.dumps([_paper("1", "2026-03-10"), _paper("2", "2026-03-11"),
+                                       _paper("3", "2026-03-17")]), encoding="utf-8")
+    return str(papers_path), str(tmp_path / "data" / "digest" / "weekly_rollups.json")
+
+
+def read_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_update_rollups_counts_each_paper_once(paths):
+    papers_path, rollups_path = paths
+    papers = read_json(papers_path)
+
+    assert update_rollups(papers[:2], rollups_path) == 2
+    assert update_rollups(papers, rollups_path) == 1
+    assert update_rollups(papers, rollups_path) == 0
+
+    rollups = read_json(rollups_path)
+    assert {k: r["count"] for k, r in rollups.items()} == {"2026-W11": 2, "2026-W12": 1}
+    assert rollups["2026-W11"]["keywords"] == {"Frailty": 2}
+
+
+def test_backfill_keeps_sent_at(paths):
+    papers_path, rollups_path = paths
+    update_rollups([_paper("1", "2026-03-10")], rollups_path)
+    rollups = read_json(rollups_path)
+    rollups["2026-W11"]["sent_at"] = "2026-03-16T08:00:00"
+    with open(rollups_path, "w", encoding="utf-8") as f:
+        json.dump(rollups, f)
+
+    assert backfill(papers_path, rollups_path) == 3
+
+    rollups = read_json(rollups_path)
+    assert rollups["2026-W11"]["count"] == 2
+    assert rollups["2026-W11"]["sent_at"] == "2026-03-16T08:00:00"
+    assert "sent_at" not in rollups["2026-W12"]
+
+
+def test_failed_backfill_leaves_rollups_untouched(paths, monkeypatch):
+    papers_path, rollups_path = paths
+    update_rollups([_paper("1", "2026-03-10")], rollups_path)
+    with open(rollups_path, encoding="utf-8") as f:
+        before = f.read()
+
+    def fail(rollup, paper):
+        raise RuntimeError("集計の途中で失敗")
+
+    monkeypatch.setattr(digest, "_add_to_rollup", fail)
+    with pytest.raises(RuntimeError):
+        backfill(papers_path, rollups_path)
+
+    with open(rollups_path, encoding="utf-8") as f:
+        assert f.read() == before
+
+
+def test_send_weekly_digest_skips_week_already_sent(paths, monkeypatch):
+    papers_path, rollups_path = paths
+    update_rollups(read_json(papers_path), rollups_path)
+    sent = []
+    monkeypatch.setattr(digest, "send_line_broadcast", lambda message: sent.append(message) or True)
+    monkeypatch.setattr(digest, "write_page", lambda rollup: None)
+
+    assert send_weekly_digest("2026-W11", rollups_path) is True
+    assert read_json(rollups_path)["2026-W11"]["sent_at"]
+    assert send_weekly_digest("2026-W11", rollups_path) is False
+    assert len(sent) == 1
+    assert send_weekly_digest("2026-W11", rollups_path, force=True) is True
+    assert len(sent) == 2
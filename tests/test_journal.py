@@ -0,0 +1,151 @@
+import os
+import json
+
+import pytest
+
+from src import utils
+from src.utils import (
+    load_json, save_json, transaction, append_json, compact_journal, update_json, load_json_versioned,
+    JOURNAL_FILENAME,
+)
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "JOURNAL_MAX_ENTRIES", 3)
+    return str(tmp_path / "data")
+
+
+def paths(data_dir):
+    return (os.path.join(data_dir, "papers.json"),
+            os.path.join(data_dir, "processed_ids.json"),
+            os.path.join(data_dir, JOURNAL_FILENAME))
+
+
+def read_raw(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_replay_applies_grouped_appends_once(data_dir):
+    papers_path, ids_path, journal_path = paths(data_dir)
+    save_json(papers_path, [{"id": "1"}])
+
+    with transaction() as txn:
+        txn.append(papers_path, [{"id": "2"}])
+        txn.append(ids_path, ["2"])
+    # 既にある id の追記は二重に反映されない
+    append_json(papers_path, [{"id": "1"}, {"id": "2"}])
+
+    assert load_json(papers_path) == [{"id": "1"}, {"id": "2"}]
+    assert load_json(ids_path) == ["2"]
+    # 本体はまだ書き換えられていない
+    assert read_raw(papers_path) == [{"id": "1"}]
+    assert os.path.exists(journal_path)
+
+
+def test_compaction_folds_journal_into_base_files(data_dir):
+    papers_path, ids_path, journal_path = paths(data_dir)
+    for i in range(3):
+        with transaction() as txn:
+            txn.append(papers_path, [{"id": str(i)}])
+            txn.append(ids_path, [str(i)])
+
+    assert not os.path.exists(journal_path)
+    assert read_raw(papers_path) == [{"id": "0"}, {"id": "1"}, {"id": "2"}]
+    assert read_raw(ids_path) == ["0", "1", "2"]
+
+
+def test_save_json_drops_pending_appends_for_rewritten_file(data_dir):
+    papers_path, ids_path, _ = paths(data_dir)
+    with transaction() as txn:
+        txn.append(papers_path, [{"id": "1"}])
+        txn.append(ids_path, ["1"])
+
+    save_json(papers_path, [{"id": "9"}])
+
+    assert load_json(papers_path) == [{"id": "9"}]
+    assert load_json(ids_path) == ["1"]
+
+
+def test_incomplete_journal_line_is_skipped(data_dir):
+    papers_path, _, journal_path = paths(data_dir)
+    append_json(papers_path, [{"id": "1"}])
+    # 書き込み途中で落ちた行
+    with open(journal_path, "a", encoding="utf-8") as f:
+        f.write('{"txn": "x", "appends": {"papers.json": [{"id": "lost"')
+
+    append_json(papers_path, [{"id": "2"}])
+
+    assert load_json(papers_path) == [{"id": "1"}, {"id": "2"}]
+
+
+def test_interrupted_compaction_is_idempotent(data_dir):
+    papers_path, _, journal_path = paths(data_dir)
+    append_json(papers_path, [{"id": "1"}, {"id": "2"}])
+    with open(journal_path, encoding="utf-8") as f:
+        journal = f.read()
+
+    compact_journal(data_dir)
+    # 本体を置き換えた後、ジャーナルを消す前に落ちた状態を再現する
+    with open(journal_path, "w", encoding="utf-8") as f:
+        f.write(journal)
+
+    assert load_json(papers_path) == [{"id": "1"}, {"id": "2"}]
+    compact_journal(data_dir)
+    assert read_raw(papers_path) == [{"id": "1"}, {"id": "2"}]
+
+
+def test_atomic_write_keeps_original_on_failure(data_dir):
+    papers_path, _, _ = paths(data_dir)
+    save_json(papers_path, [{"id": "1"}])
+
+    # シリアライズできない値で書き込みが途中で失敗しても、元のファイルは残る
+    save_json(papers_path, [{"id": "2", "bad": object()}])
+
+    assert read_raw(papers_path) == [{"id": "1"}]
+    assert [n for n in os.listdir(data_dir) if n.endswith(".tmp")] == []
+
+
+def test_commit_survives_compaction_failure(data_dir):
+    papers_path, ids_path, journal_path = paths(data_dir)
+    os.makedirs(data_dir)
+    with open(papers_path, "w", encoding="utf-8") as f:
+        f.write('<<<<<<< HEAD\n[{"id": "0"}]\n')
+
+    for i in range(3):
+        with transaction() as txn:
+            txn.append(papers_path, [{"id": str(i + 1)}])
+            txn.append(ids_path, [str(i + 1)])
+
+    # compaction は失敗するが、追記はジャーナルに残り、壊れた本体は上書きされない
+    assert os.path.exists(journal_path)
+    assert len(utils._read_journal(journal_path)) == 3
+    with open(papers_path, encoding="utf-8") as f:
+        assert f.read().startswith("<<<<<<< HEAD")
+    assert load_json(ids_path) == ["1", "2", "3"]
+
+
+def test_update_json_does_not_overwrite_unreadable_file(data_dir):
+    rollups_path = os.path.join(data_dir, "weekly_rollups.json")
+    os.makedirs(data_dir)
+    conflicted = '<<<<<<< HEAD\n{"2026-W10": {"sent_at": "2026-03-09"}}\n'
+    with open(rollups_path, "w", encoding="utf-8") as f:
+        f.write(conflicted)
+
+    with pytest.raises(json.JSONDecodeError):
+        update_json(rollups_path, lambda rollups: {**rollups, "new": 1}, {})
+    with pytest.raises(json.JSONDecodeError):
+        load_json_versioned(rollups_path, {})
+
+    with open(rollups_path, encoding="utf-8") as f:
+        assert f.read() == conflicted
+
+
+def test_update_json_starts_from_default_or_journal(data_dir):
+    papers_path, _, _ = paths(data_dir)
+    rollups_path = os.path.join(data_dir, "weekly_rollups.json")
+
+    assert update_json(rollups_path, lambda rollups: {**rollups, "new": 1}, {}) == {"new": 1}
+    append_json(papers_path, [{"id": "1"}])
+    assert update_json(papers_path, lambda papers: papers + [{"id": "2"}], []) == [{"id": "1"}, {"id": "2"}]
@@ -0,0 +1,33 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from src import metrics
+
+
+def test_report_does_not_touch_other_runs_temp_file(tmp_path):
+    metrics_dir = tmp_path / "metrics"
+    metrics_dir.mkdir()
+    # 重なって実行中の別プロセスが書いている途中の一時ファイル
+    other = metrics_dir / f"{metrics.PROM_FILENAME}.tmp"
+    other.write_text("# other run\n", encoding="utf-8")
+    metrics.reset()
+    metrics.incr("papers.fetched", 3)
+
+    _, prom_path = metrics.write_report(str(metrics_dir))
+
+    assert other.read_text(encoding="utf-8") == "# other run\n"
+    with open(prom_path, encoding="utf-8") as f:
+        assert "anesth_batch_papers_fetched_total 3" in f.read()
+
+
+def test_overlapping_reports_leave_a_complete_file(tmp_path):
+    metrics_dir = str(tmp_path / "metrics")
+    metrics.reset()
+    metrics.incr("papers.fetched", 3)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: metrics.write_report(metrics_dir), range(16)))
+
+    assert [name for name in os.listdir(metrics_dir) if name.endswith(".tmp")] == []
+    with open(os.path.join(metrics_dir, metrics.PROM_FILENAME), encoding="utf-8") as f:
+        assert "anesth_batch_papers_fetched_total 3" in f.read()
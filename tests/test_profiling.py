@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+from src import profiling
+from src.profiling import RenderProfiler, CPROFILE_KEY, TIMINGS_KEY
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    path = str(tmp_path / "profiles")
+    monkeypatch.setattr(profiling, "PROFILE_DIR", path)
+    return path
+
+
+def test_cprofile_is_recorded_once(profile_dir):
+    state = {CPROFILE_KEY: True}
+    profiler = RenderProfiler(state, enabled=True)
+    profiler.finish()
+
+    assert os.listdir(profile_dir) == [os.path.basename(profiler.stats_path)]
+    # チェックが外れるので次の再描画では記録しない
+    assert state[CPROFILE_KEY] is False
+    assert RenderProfiler(state, enabled=True)._profile is None
+
+
+def test_interrupted_render_still_disables_cprofile(profile_dir):
+    state = {CPROFILE_KEY: True}
+    with pytest.raises(RuntimeError):
+        profiler = RenderProfiler(state, enabled=True)
+        try:
+            with profiler.section("widgets"):
+                raise RuntimeError("st.rerun() の代わり")
+        finally:
+            profiler.finish()
+
+    assert sys.getprofile() is None
+    assert state[CPROFILE_KEY] is False
+    assert os.path.exists(profiler.stats_path)
+    assert "widgets" in state[TIMINGS_KEY][-1]
@@ -0,0 +1,121 @@
+import os
+import json
+
+import numpy as np
+import pytest
+
+from src.similarity import SimilarityIndex, rebuild_index, update_index, META_FILENAME
+
+
+def make_papers(n, start=0):
+    topics = ["sugammadex neuromuscular blockade", "video laryngoscope intubation",
+              "regional anesthesia nerve block", "glp-1 aspiration risk"]
+    return [{
+        "id": str(start + i),
+        "original_title": f"{topics[(start + i) % len(topics)]} study {start + i}",
+        "abstract": f"{topics[(start + i) % len(topics)]} outcomes in adults",
+    } for i in range(n)]
+
+
+def read_meta(index_dir):
+    with open(os.path.join(index_dir, META_FILENAME), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_rewrites_do_not_touch_mapped_matrix(tmp_path):
+    index_dir = str(tmp_path / "index")
+    papers = make_papers(40)
+    rebuild_index(papers, index_dir)
+    index = SimilarityIndex.load(index_dir)
+    before = np.array(index.matrix)
+    matrix_path = os.path.join(index_dir, read_meta(index_dir)["matrix"])
+
+    # 読み手が memory-map している間に追記・縮小を伴う再構築を行っても、読み手は古い内容を読める
+    update_index(papers + make_papers(5, start=40), index_dir)
+    rebuild_index(papers[:3], index_dir)
+
+    assert not os.path.exists(matrix_path)
+    assert os.listdir(index_dir).count(read_meta(index_dir)["matrix"]) == 1
+    assert np.array_equal(np.array(index.matrix), before)
+    assert index.related("0", k=3)
+    assert len(SimilarityIndex.load(index_dir)) == 3
+
+
+def test_update_appends_rows_for_new_papers(tmp_path):
+    index_dir = str(tmp_path / "index")
+    papers = make_papers(40)
+    rebuild_index(papers, index_dir)
+
+    assert update_index(papers + make_papers(5, start=40), index_dir) == 5
+    index = SimilarityIndex.load(index_dir)
+    assert len(index) == 45
+    assert "44" in index
+    assert index.related("44", k=1)[0][0] in {str(i) for i in range(0, 45, 4)}
+
+
+def _rebuild_repeatedly(papers, index_dir):
+    for i in range(15):
+        rebuild_index(papers[::-1] if i % 2 else papers, index_dir)
+
+
+def _append_repeatedly(papers, index_dir):
+    for n in range(len(papers) - 15, len(papers) + 1):
+        update_index(papers[:n], index_dir)
+
+
+def test_concurrent_rebuild_and_update_keep_rows_aligned(tmp_path):
+    import multiprocessing
+    from src.similarity import _hash_token
+
+    index_dir = str(tmp_path / "index")
+    papers = [dict(p, abstract=f"{p['abstract']} uniq{p['id']}x") for p in make_papers(60)]
+    rebuild_index(papers[:45], index_dir)
+
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=_rebuild_repeatedly, args=(papers[:45], index_dir)),
+               ctx.Process(target=_append_repeatedly, args=(papers, index_dir))]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+        assert w.exitcode == 0
+
+    # 行番号 → ID の対応が崩れていなければ、各行はその論文固有の語の列が非ゼロになる
+    index = SimilarityIndex.load(index_dir)
+    for row, pid in enumerate(index.ids):
+        assert index.matrix[row, _hash_token(f"uniq{pid}x")] > 0, pid
+
+
+def test_load_rejects_matrix_that_does_not_match_ids(tmp_path):
+    index_dir = str(tmp_path / "index")
+    rebuild_index(make_papers(40), index_dir)
+    meta = read_meta(index_dir)
+
+    # 行列を置き換えた後、メタ情報の書き込みに失敗した状態 (別の ID 一覧の行列と組になっている)
+    meta["ids"] = meta["ids"][::-1]
+    with open(os.path.join(index_dir, META_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    assert SimilarityIndex.load(index_dir) is None
+
+    # 次の更新で作り直される
+    assert update_index(make_papers(40), index_dir) == 40
+    assert len(SimilarityIndex.load(index_dir)) == 40
+
+
+def test_failed_meta_write_raises(tmp_path, monkeypatch):
+    import src.similarity as similarity
+
+    index_dir = str(tmp_path / "index")
+    rebuild_index(make_papers(40), index_dir)
+    real_atomic_write = similarity.atomic_write
+
+    def fail_on_meta(filepath, write, binary=False):
+        if filepath.endswith(META_FILENAME):
+            raise OSError("disk full")
+        return real_atomic_write(filepath, write, binary)
+
+    monkeypatch.setattr(similarity, "atomic_write", fail_on_meta)
+    with pytest.raises(OSError):
+        rebuild_index(make_papers(30), index_dir)
+    # 古いメタ情報と古い行列の組のまま読める
+    assert len(SimilarityIndex.load(index_dir)) == 40
@@ -0,0 +1,37 @@
+import pytest
+
+from src.table import papers_to_frame, keyword_hits, filter_papers, topic_trend
+
+
+def _paper(pid, title, abstract="", fetched_date="2026-03-01"):
+    return {"id": pid, "original_title": title, "abstract": abstract, "fetched_date": fetched_date, "importance": 3}
+
+
+@pytest.mark.parametrize("title, keyword, expected", [
+    ("SGLT-2 inhibitors before surgery", "SGLT2", True),
+    ("Effect of SGLT 2 inhibition", "SGLT2", True),
+    ("GLP-1 receptor agonists and aspiration", "GLP-1", True),
+    ("Video laryngoscopes in the ICU", "Video Laryngoscope", True),
+    ("Postoperative frailty index", "Frailty", True),
+    ("Antifrailty programs", "Frailty", False),  # 語の途中からはマッチしない
+    ("Regional anaesthesia", "Regional Anesthesia", False),
+])
+def test_keyword_hits_follow_facet_patterns(title, keyword, expected):
+    df = papers_to_frame([_paper("1", title)])
+    assert bool(keyword_hits(df)[keyword].iloc[0]) is expected
+
+
+def test_precomputed_hits_give_same_results():
+    papers = [
+        _paper("1", "POCUS for gastric volume", fetched_date="2026-03-01"),
+        _paper("2", "Frailty and delirium", "Point-of-care POCUS", fetched_date="2026-04-02"),
+        _paper("3", "Remimazolam sedation", fetched_date="2026-04-03"),
+    ]
+    df = papers_to_frame(papers)
+    hits = keyword_hits(df)
+
+    filtered = filter_papers(df, keywords=["POCUS"], hits=hits)
+    assert list(filtered["id"]) == ["1", "2"]
+    assert filter_papers(df, keywords=["POCUS"]).equals(filtered)
+    assert topic_trend(df, hits=hits).equals(topic_trend(df))
+    assert topic_trend(df).loc["2026-04", "POCUS"] == 1